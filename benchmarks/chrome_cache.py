@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compare painting the panel chrome layer by layer with the ChromeCache. """
+
+import os
+import sys
+import timeit
+
+import cairo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from simplepanel.compositor import ChromeCache, get_fade_alpha
+
+HEIGHT = 40
+WIDTHS = [1920, 3840, 7680]
+FRAMES = 30
+REPEAT = 5
+
+
+def make_layer(width, height, rgba):
+
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgba(*rgba)
+    ctx.rectangle(0, 0, width, 24)
+    ctx.fill()
+    return surface
+
+
+def fade_states():
+    """ Progress values as produced by one maximize fade. """
+
+    for i in xrange(FRAMES):
+        yield float(i) / (FRAMES - 1)
+
+
+def paint_layers(target, layers):
+
+    background, shadow, border = layers
+
+    for progress in fade_states():
+        bg, sdw = get_fade_alpha(progress)
+        ctx = cairo.Context(target)
+
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_rgba(0, 0, 0, 0)
+        ctx.paint()
+
+        ctx.set_operator(cairo.OPERATOR_OVER)
+
+        ctx.set_source_surface(background)
+        ctx.paint_with_alpha(bg)
+
+        ctx.set_source_surface(shadow)
+        ctx.paint_with_alpha(sdw)
+
+        ctx.set_source_surface(border)
+        ctx.paint()
+
+
+def paint_cached(target, cache):
+
+    for progress in fade_states():
+        ctx = cairo.Context(target)
+
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_surface(cache.get_surface(progress))
+        ctx.paint()
+
+
+def main():
+
+    print '{0:>6} {1:>14} {2:>14} {3:>8}'.format('width', 'layers (ms)', 'cached (ms)', 'speedup')
+
+    for width in WIDTHS:
+        layers = (
+            make_layer(width, HEIGHT, (.9, .9, .9, 1)),
+            make_layer(width, HEIGHT, (0, 0, 0, .3)),
+            make_layer(width, HEIGHT, (.5, .5, .5, 1))
+            )
+        target = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, HEIGHT)
+
+        cache = ChromeCache()
+        cache.set_layers(*layers)
+        # Warm the cache, the first fade populates it with every state a
+        # fade passes through, so all measured fades only hit.
+        paint_cached(target, cache)
+        assert len(cache) == cache.steps + 1
+
+        layered = min(timeit.repeat(lambda: paint_layers(target, layers), number=1, repeat=REPEAT))
+        cached = min(timeit.repeat(lambda: paint_cached(target, cache), number=1, repeat=REPEAT))
+
+        print '{0:>6} {1:>14.3f} {2:>14.3f} {3:>7.1f}x'.format(
+            width,
+            layered * 1000 / FRAMES,
+            cached * 1000 / FRAMES,
+            layered / cached
+            )
+
+
+if __name__ == '__main__':
+    main()
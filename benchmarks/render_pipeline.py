@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the panel's layout, hit-testing and render path without X.
+
+Stub applets (cheap, text-heavy and icon-heavy) are laid out with the
+panel's `PanelLayout`, indexed with its `AppletIndex` and painted with the
+helpers from `simplepanel.pipeline` the panel uses itself: `render` repaints
+every applet into its retained surface before compositing the panel,
+`composite` only blits the cached surfaces like most exposes do. For every
+combination of applet kind, applet count and panel width the operations per
+second and the net change of objects tracked by the garbage collector per
+operation are reported; `--output` writes them as JSON to compare revisions.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import platform
+
+from optparse import OptionParser
+
+import cairo
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from simplepanel.layout import PanelLayout
+from simplepanel.hittest import AppletIndex
+from simplepanel.pipeline import SurfaceCache, relayout, composite
+
+HEIGHT = 24
+PANEL_HEIGHT = 40
+COUNTS = [10, 50, 200]
+WIDTHS = [1920, 3840]
+REPEAT = 5
+MIN_TIME = .2
+HITS = 1000
+
+ICON_SIZE = 22
+ICONS = 4
+
+
+class StubApplet(object):
+    """ The parts of the applet interface the panel uses for painting. """
+
+    width = 24
+
+    def __init__(self):
+        self.position = (0, 0)
+
+
+    def set_position(self, x, y):
+        self.position = (x, y)
+
+
+    def get_position(self):
+        return self.position
+
+
+    def get_allocation(self):
+        return (self.width, HEIGHT)
+
+
+class CheapApplet(StubApplet):
+
+    def render(self, ctx):
+
+        ctx.set_source_rgba(.2, .4, .8, .8)
+        ctx.rectangle(2, 2, self.width - 4, HEIGHT - 4)
+        ctx.fill()
+
+
+class TextApplet(StubApplet):
+
+    width = 120
+
+    def render(self, ctx):
+
+        ctx.select_font_face('sans-serif')
+        ctx.set_font_size(9)
+        ctx.set_source_rgb(0, 0, 0)
+
+        ctx.move_to(2, 10)
+        ctx.show_text(time.strftime('%H:%M:%S %A'))
+        ctx.move_to(2, 21)
+        ctx.show_text(time.strftime('%d. %B %Y'))
+
+
+class IconApplet(StubApplet):
+
+    width = ICONS * ICON_SIZE + 4
+
+    icon = None
+
+    def render(self, ctx):
+
+        # Icons are loaded larger than they are shown, just like pixbufs
+        # scaled by the applets.
+        scale = float(ICON_SIZE) / self.icon.get_width()
+        for i in xrange(ICONS):
+            ctx.save()
+            ctx.translate(2 + i * ICON_SIZE, 1)
+            ctx.scale(scale, scale)
+            ctx.set_source_surface(self.icon)
+            ctx.paint()
+            ctx.restore()
+
+
+KINDS = {
+    'cheap': CheapApplet,
+    'text': TextApplet,
+    'icon': IconApplet
+    }
+
+
+def make_icon(size=48):
+
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+    ctx = cairo.Context(surface)
+    gradient = cairo.RadialGradient(size / 2, size / 2, 0, size / 2, size / 2, size / 2)
+    gradient.add_color_stop_rgba(0, 1, .8, .2, 1)
+    gradient.add_color_stop_rgba(1, .8, .2, 0, 0)
+    ctx.set_source(gradient)
+    ctx.paint()
+    return surface
+
+
+def make_layout(applet_class, count):
+    """ Put half of the applets into a left and half into a right group. """
+
+    left = count // 2
+    layout = PanelLayout.from_list([
+        {'orientation': 'left', 'position': 0,
+         'objects': [{'type': 'applet', 'id': 'left{0}'.format(i)} for i in xrange(left)]},
+        {'orientation': 'right', 'position': 0,
+         'objects': [{'type': 'applet', 'id': 'right{0}'.format(i)} for i in xrange(count - left)]}
+        ])
+
+    for group in layout:
+        for slot in group.applets:
+            slot.instance = applet_class()
+    layout.update_instances()
+
+    return layout
+
+
+def paint_frame(layout, surfaces, target, width):
+    """ Composite the panel from the applet surfaces, like `Panel.expose_cb`. """
+
+    ctx = cairo.Context(target)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    ctx.set_source_rgba(.9, .9, .9, .5)
+    ctx.paint()
+    ctx.set_operator(cairo.OPERATOR_OVER)
+
+    composite(ctx, layout.instances, surfaces.get_surface,
+              lambda (x, y, w, h): x + w > 0 and x < width)
+
+
+def render_frame(layout, surfaces, target, width):
+    """ Repaint every applet and composite the panel. """
+
+    for applet in layout.instances:
+        surfaces.invalidate(applet)
+    paint_frame(layout, surfaces, target, width)
+
+
+def measure(func, ops=1):
+    """
+    Return the best operations per second of `REPEAT` runs and the net
+    change of the number of objects tracked by the garbage collector per
+    operation. Python 2 has no allocation tracer, objects freed during the
+    operation are not counted (see `gc.get_count`).
+    """
+
+    number = 1
+    while True:
+        start = time.time()
+        for i in xrange(number):
+            func()
+        if time.time() - start >= MIN_TIME / REPEAT:
+            break
+        number *= 2
+
+    best = None
+    for i in xrange(REPEAT):
+        start = time.time()
+        for j in xrange(number):
+            func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.get_count()[0]
+        func()
+        objects = gc.get_count()[0] - before
+    finally:
+        gc.enable()
+
+    return number * ops / best, float(objects) / ops
+
+
+def run(kinds, counts, widths):
+
+    IconApplet.icon = make_icon()
+    random.seed(0)
+
+    results = []
+
+    for kind in kinds:
+        for count in counts:
+            for width in widths:
+                layout = make_layout(KINDS[kind], count)
+                index = AppletIndex()
+                rectangles = {}
+                surfaces = SurfaceCache()
+                target = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, PANEL_HEIGHT)
+                relayout(layout, width, rectangles)
+                index.rebuild(layout.instances)
+
+                hits = [(random.uniform(0, width), random.uniform(0, HEIGHT)) for i in xrange(HITS)]
+
+                def layout_groups():
+                    for group in layout:
+                        group.layout(width)
+
+                def relayout_full():
+                    rectangles.clear()
+                    relayout(layout, width, rectangles)
+                    index.rebuild(layout.instances)
+
+                def hit_test():
+                    for x, y in hits:
+                        index.get_applet_at_coords(x, y)
+
+                benchmarks = [
+                    ('layout', layout_groups, 1),
+                    ('relayout', relayout_full, 1),
+                    ('hittest', hit_test, HITS),
+                    ('render', lambda: render_frame(layout, surfaces, target, width), 1),
+                    ('composite', lambda: paint_frame(layout, surfaces, target, width), 1)
+                    ]
+
+                for name, func, ops in benchmarks:
+                    ops_per_sec, objects = measure(func, ops)
+                    result = {
+                        'benchmark': name,
+                        'kind': kind,
+                        'count': count,
+                        'width': width,
+                        'ops_per_sec': ops_per_sec,
+                        'gc_objects_per_op': objects
+                        }
+                    results.append(result)
+                    print '{0:<10} {1:<6} {2:>6} {3:>6} {4:>14.1f} {5:>20.1f}'.format(
+                        name, kind, count, width, ops_per_sec, objects)
+
+    return results
+
+
+def main():
+
+    parser = OptionParser()
+    parser.add_option('--kinds', default=','.join(sorted(KINDS)),
+                      help='comma separated applet kinds [%default]')
+    parser.add_option('--counts', default=','.join(map(str, COUNTS)),
+                      help='comma separated applet counts [%default]')
+    parser.add_option('--widths', default=','.join(map(str, WIDTHS)),
+                      help='comma separated panel widths [%default]')
+    parser.add_option('--output', help='write the results as JSON to this file')
+    parser.add_option('--label', default='', help='name of the revision benchmarked')
+    options, args = parser.parse_args()
+
+    kinds = options.kinds.split(',')
+    counts = [int(count) for count in options.counts.split(',')]
+    widths = [int(width) for width in options.widths.split(',')]
+
+    print '{0:<10} {1:<6} {2:>6} {3:>6} {4:>14} {5:>20}'.format(
+        'benchmark', 'kind', 'count', 'width', 'ops/sec', 'net gc objects/op')
+
+    results = run(kinds, counts, widths)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'label': options.label,
+                'python': platform.python_version(),
+                'cairo': cairo.cairo_version_string(),
+                'time': time.time(),
+                'results': results
+                }, f, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
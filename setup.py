@@ -3,6 +3,7 @@
 import os
 from distutils.core import setup
 from distutils.command.install_scripts import install_scripts
+from distutils.command.install_data import install_data
 
 class post_install(install_scripts):
 
@@ -16,6 +17,19 @@ class post_install(install_scripts):
             print "moving '{0}' to '{1}'".format(i, n)
 
 
+class compile_applets(install_data):
+    """ Byte-compile the installed applets, so they are not compiled on every start. """
+
+    def run(self):
+        install_data.run(self)
+
+        import py_compile
+        for i in self.get_outputs():
+            if i.endswith('.py') and '/data/applets/' in i:
+                py_compile.compile(i)
+                print "byte-compiling '{0}'".format(i)
+
+
 def collect_data_files():
 
     data_files = []
@@ -23,6 +37,8 @@ def collect_data_files():
     for directory, directories, files in os.walk('src/data'):
         rel_dir = directory.replace('src/data/', '')
         for file_ in files:
+            if file_.endswith('.pyc'):
+                continue
             data_files.append((
                     os.path.join('share/cream/{0}/data'.format(ID), rel_dir),
                     [os.path.join(directory, file_)]
@@ -52,6 +68,6 @@ setup(
     package_data={'simplepanel': ['background.svg']},
     packages = ['simplepanel'],
     data_files = data_files,
-    cmdclass={'install_scripts': post_install},
+    cmdclass={'install_scripts': post_install, 'install_data': compile_applets},
     scripts = ['src/simple-panel.py']
 )
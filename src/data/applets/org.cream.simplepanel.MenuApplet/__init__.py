@@ -2,7 +2,6 @@ import gobject
 import gtk
 import cairo
 import re
-import thread
 
 from collections import defaultdict
 
@@ -141,23 +140,32 @@ class MenuApplet(simplepanel.applet.Applet):
         self.config.connect('field-value-changed', self.config_value_changed_cb)
 
         self.categories = []
+        self.desktop_entries = defaultdict(list)
 
         for cat in MENU_CATEGORIES:
             category = Category(CATEGORIES[cat][0])
             category.connect('hide', self.menu_hide_cb)
             self.categories.append(category)
 
-        thread.start_new_thread(self.fill_categories, ())
+        self.run_in_background(self.collect_desktop_entries, self.fill_categories)
 
 
-    def fill_categories(self):
+    def collect_desktop_entries(self):
+        """ Parse the desktop entries, runs in a worker thread. """
 
-        self.desktop_entries = defaultdict(list)
+        desktop_entries = defaultdict(list)
 
         for desktop_entry in DesktopEntry.get_all():
             category = CATEGORIES.get(desktop_entry.recommended_category)
             if category:
-                self.desktop_entries[category[0]].append(desktop_entry)
+                desktop_entries[category[0]].append(desktop_entry)
+
+        return desktop_entries
+
+
+    def fill_categories(self, desktop_entries):
+
+        self.desktop_entries = desktop_entries
 
         for category in self.categories:
             entries = self.desktop_entries[category.id]
@@ -175,12 +183,17 @@ class MenuApplet(simplepanel.applet.Applet):
 
     def get_category_at_coords(self, x, y):
 
-        for c, category in enumerate(self.categories):
-            w = h = self.default_size
-            x0, y0 = PADDING + c * (w + PADDING), 1
-            x1, y1 = x0 + w, y0 + h
-            if x >= x0 and x <= x1 and y >= y0 and y <= y1:
-                return (category, x0, x1-x0)
+        # Icons are laid out on a fixed grid, so the category can be computed
+        # directly instead of scanning all of them.
+        w = h = self.default_size
+        c = int((x - PADDING) // (w + PADDING))
+        if c < 0 or c >= len(self.categories):
+            return (None, None, None)
+
+        x0, y0 = PADDING + c * (w + PADDING), 1
+        x1, y1 = x0 + w, y0 + h
+        if x >= x0 and x <= x1 and y >= y0 and y <= y1:
+            return (self.categories[c], x0, x1-x0)
 
         return (None, None, None)
 
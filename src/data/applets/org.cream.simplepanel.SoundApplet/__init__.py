@@ -12,20 +12,40 @@ from pulseaudio import PulseAudio
 
 PADDING = 5
 STEP = 5
+CONNECT_TIMEOUT = 5
 
 @simplepanel.applet.register
 class SoundApplet(simplepanel.applet.Applet):
 
+    needs_async_init = True
+
     def __init__(self):
         simplepanel.applet.Applet.__init__(self)
 
-        self.pulseaudio = PulseAudio('Cream Volume Applet')
-        self.pulseaudio.connect()
-        while not self.pulseaudio.sinks:
-            time.sleep(0.01)
-
         self.icon_size = 22
         self.menu_active = False
+        self.icon = self._get_icon_for_volume(0)
+
+
+    def init_async(self):
+
+        pulseaudio = PulseAudio('Cream Volume Applet')
+        pulseaudio.connect()
+
+        # Without a sound server the applet stays muted instead of keeping
+        # a worker busy forever.
+        deadline = time.time() + CONNECT_TIMEOUT
+        while not pulseaudio.sinks:
+            if time.time() > deadline:
+                raise RuntimeError("No PulseAudio sinks after {0} seconds".format(CONNECT_TIMEOUT))
+            time.sleep(0.01)
+
+        return pulseaudio
+
+
+    def init_finish(self, pulseaudio):
+
+        self.pulseaudio = pulseaudio
         self.icon = self._get_icon_for_volume(self.pulseaudio.get_volume()[0])
 
         self.menu = Bubble()
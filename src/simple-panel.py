@@ -18,61 +18,69 @@
 
 import sys
 import os
-import imp
 import gobject
 import gtk
 import cairo
 import wnck
 import json
+import signal
+import logging
 
 import tempfile
 import time
+import hashlib
 from operator import itemgetter
+from collections import deque
 
 import cream
-import cream.manifest
 import cream.gui
-import cream.gui.svg
 
-import simplepanel.applet
 from simplepanel.dialog import AddAppletDialog
+from simplepanel.compositor import AppletSurfaceCache, ChromeCache, applet_rectangle, intersects
+from simplepanel import pipeline
+from simplepanel.scheduler import FrameScheduler
+from simplepanel.theme import Theme, ThemeCache
+from simplepanel.maximized import MaximizedWindowIndex
+from simplepanel.hittest import AppletIndex
+from simplepanel.pointer import PointerTracker
+from simplepanel.host import RemoteApplet
+from simplepanel.loader import get_loader
+from simplepanel.manifests import ManifestIndex
+from simplepanel.profiler import get_profiler, configure as configure_profiler
+from simplepanel.stats import AppletStats
+from simplepanel.overlay import DebugOverlay
+from simplepanel.watchdog import MainLoopWatchdog
+from simplepanel.memory import MemoryAccountant
+from simplepanel.persistence import LayoutStore
+from simplepanel.snapshot import SnapshotStore, FrameStore, PlaceholderApplet
+from simplepanel.util import add_signal_handler
 
 FADE_DURATION = 500
+CHROME_TRIM_DELAY = 30
+SNAPSHOT_INTERVAL = 30
+STARTUP_TIMEOUT = 5
+LAYOUT_FILE = 'applets.json'
+PANEL_HEIGHT = 40
 MOUSE_BUTTON_RIGHT = 3
 
-def copy_layout(layout):
-    l = []
-
-    for group in layout:
-        g = {}
-        g['orientation'] = group['orientation']
-        g['position'] = group['position']
-        g['objects'] = []
-
-        for obj in group['objects']:
-            o = {}
-            o['type'] = obj['type']
-
-            if obj['type'] == 'applet':
-                o['id'] = obj['id']
-            else:
-                o['size'] = obj['size']
-
-            g['objects'].append(o)
-
-        l.append(g)
-
-    return l
-
+logger = logging.getLogger('simplepanel')
 
 class PanelWindow(gtk.Window):
 
-    def __init__(self, path):
+    def __init__(self, path, frames=None, layout_digest=None):
 
         gtk.Window.__init__(self)
 
         self.path = path
-        self._alpha = (.5, 1)
+        self.profiler = get_profiler()
+        self.frame = None
+        self._background_ready = False
+        self._fade = 0
+        self._trim_source = None
+        self.chrome = ChromeCache()
+        self.overlay = DebugOverlay(self)
+        self.theme_cache = ThemeCache()
+        self.theme = Theme(os.path.join(self.path, 'data/themes/default'), self.theme_cache)
 
         # Setting up the Widget's window...
         self.stick()
@@ -89,94 +97,181 @@ class PanelWindow(gtk.Window):
         self.screen = self.display.get_default_screen()
         self.screen.connect('size-changed', self.screen_size_changed_cb)
 
-        self.set_size_request(self.screen.get_width(), 40)
+        self.set_size_request(self.screen.get_width(), PANEL_HEIGHT)
+
+        if frames is not None:
+            self.frame = frames.load(self.get_frame_key(layout_digest))
 
         self.connect('expose-event', self.expose_cb)
+        self.connect_after('expose-event', self.overlay_expose_cb)
         self.connect('realize', self.realize_cb)
         self.connect('size-allocate', self.size_allocate_cb)
 
-        width, height = self.get_size()
-        
-        self.draw_background()
-        
-        
+        # With a persisted frame to show the chrome is prepared once that
+        # frame is on screen.
+        if self.frame is None:
+            self.draw_background()
+
+
+    def get_frame_key(self, layout):
+        """ Identify what a persisted frame of this window depends on. """
+
+        return {
+            'width': self.screen.get_width(),
+            'height': PANEL_HEIGHT,
+            'theme': self.theme.path,
+            'theme_mtime': self.theme.get_mtime(),
+            'layout': layout
+            }
+
+
+    def drop_frame(self):
+        """ Stop showing the persisted frame and paint the real chrome. """
+
+        if self.frame is None:
+            return
+
+        self.frame = None
+        if not self._background_ready:
+            self.draw_background()
+        self.queue_draw()
+
+
     def draw_background(self):
-        
+
         width, height = self.get_size()
+        self._background_ready = True
+
+        with self.profiler.phase('draw_background'):
+            self.background_surface = self.theme.get_layer('background', width, height)
+            self.shadow_surface = self.theme.get_layer('shadow', width, height)
+            self.border_surface = self.theme.get_layer('border', width, height)
+
+            self.chrome.set_layers(self.background_surface, self.shadow_surface, self.border_surface)
+
+
+    def set_theme(self, path):
+
+        self.theme = Theme(path, self.theme_cache)
+        self.drop_frame()
+        self.draw_background()
+        self.queue_draw()
+
+
+    def set_debug_overlay(self, enabled):
+        self.overlay.set_enabled(enabled)
+
 
-        # Draw the background…
-        self.background_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
-        background_ctx = cairo.Context(self.background_surface)
+    def invalidate(self, rectangle):
 
-        background = cream.gui.svg.Handle(os.path.join(self.path, 'data/themes/default/background.svg'))
-        background.dom.getElementById('stretch').setAttribute('width', str(width))
-        background.dom.getElementById('stretch').setAttribute('height', str(24))
-        background.save_dom()
-        background.render_cairo(background_ctx)
+        if self.overlay.enabled:
+            self.overlay.add_damage([rectangle])
+        self.window.invalidate_rect(rectangle, True)
 
-        # … and the shadow…
-        self.shadow_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
-        shadow_ctx = cairo.Context(self.shadow_surface)
-        shadow_ctx.translate(0, 23)
-        shadow = cream.gui.svg.Handle(os.path.join(self.path, 'data/themes/default/shadow.svg'))
-        shadow.dom.getElementById('shadow').setAttribute('width', str(width))
-        shadow.save_dom()
-        shadow.render_cairo(shadow_ctx)
 
-        # … and the border.
-        self.border_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
-        border_ctx = cairo.Context(self.border_surface)
-        border_ctx.translate(0, 23)
-        border = cream.gui.svg.Handle(os.path.join(self.path, 'data/themes/default/border.svg'))
-        border.dom.getElementById('border').setAttribute('width', str(width))
-        border.save_dom()
-        border.render_cairo(border_ctx)
+    def invalidate_region(self, region):
 
+        if self.overlay.enabled:
+            self.overlay.add_damage(region.get_rectangles())
+        self.window.invalidate_region(region, True)
 
-    def set_alpha(self, bg, sdw):
-        self._alpha = (bg, sdw)
 
+    def set_fade(self, progress):
+        """ Set the progress of the fade to the opaque chrome shown while a window is maximized. """
 
-    def get_alpha(self):
-        return self._alpha
+        self._fade = progress
+
+        if self._trim_source is not None:
+            gobject.source_remove(self._trim_source)
+            self._trim_source = None
+
+        # Keep the intermediate states around for the next fade for a while.
+        if progress in (0, 1):
+            self._trim_source = gobject.timeout_add_seconds(CHROME_TRIM_DELAY, self._trim_chrome)
+
+
+    def _trim_chrome(self):
+
+        self._trim_source = None
+        self.chrome.trim()
+        return False
+
+
+    def get_fade(self):
+        return self._fade
 
 
     def realize_cb(self, window):
-        self.window.set_events(self.window.get_events() | gtk.gdk.BUTTON_RELEASE_MASK | gtk.gdk.POINTER_MOTION_MASK | gtk.gdk.SCROLL_MASK)
+        self.window.set_events(self.window.get_events() | gtk.gdk.BUTTON_RELEASE_MASK | gtk.gdk.POINTER_MOTION_MASK | gtk.gdk.POINTER_MOTION_HINT_MASK | gtk.gdk.ENTER_NOTIFY_MASK | gtk.gdk.LEAVE_NOTIFY_MASK | gtk.gdk.SCROLL_MASK)
         self.window.property_change("_NET_WM_STRUT", "CARDINAL", 32, gtk.gdk.PROP_MODE_REPLACE, [0, 0, 24, 0])
         self.window.input_shape_combine_region(gtk.gdk.region_rectangle((0, 0, self.get_size()[0], 24)), 0, 0)
 
 
     def expose_cb(self, source, event):
-        """ Clear the widgets background. """
+        """ Replace the widgets background with the composited chrome. """
+
+        if self.overlay.enabled:
+            self.overlay.expose_started()
 
         ctx = source.window.cairo_create()
 
+        # Only the damaged part of the chrome needs to be repainted.
+        ctx.region(event.region)
+        ctx.clip()
+
         ctx.set_operator(cairo.OPERATOR_SOURCE)
-        ctx.set_source_rgba(0, 0, 0, 0)
+
+        if self.frame is not None:
+            ctx.set_source_surface(self.frame)
+            ctx.paint()
+            if not self._background_ready:
+                gobject.idle_add(self._prepare_background, priority=gobject.PRIORITY_LOW)
+            return
+
+        ctx.set_source_surface(self.chrome.get_surface(self.get_fade()))
         ctx.paint()
 
         ctx.set_operator(cairo.OPERATOR_OVER)
+        
+        
+    def overlay_expose_cb(self, source, event):
+        """ Paint the debug overlay on top of the applets. """
 
-        ctx.set_source_surface(self.background_surface)
-        ctx.paint_with_alpha(self.get_alpha()[0])
+        if not self.overlay.is_visible():
+            return
+
+        if self.overlay.enabled:
+            self.overlay.expose_finished()
+
+        ctx = source.window.cairo_create()
+        ctx.region(event.region)
+        ctx.clip()
+        self.overlay.paint(ctx)
+
+
+    def _prepare_background(self):
+
+        if not self._background_ready:
+            self.draw_background()
+        return False
 
-        ctx.set_source_surface(self.shadow_surface)
-        ctx.paint_with_alpha(self.get_alpha()[1])
 
-        ctx.set_source_surface(self.border_surface)
-        ctx.paint_with_alpha(100)
-        
-        
     def screen_size_changed_cb(self, screen):
-        
-        self.set_size_request(self.screen.get_width(), 40)
-        self.resize(self.screen.get_width(), 40)
+
+        self.drop_frame()
+        self.set_size_request(self.screen.get_width(), PANEL_HEIGHT)
+        self.resize(self.screen.get_width(), PANEL_HEIGHT)
         
         
     def size_allocate_cb(self, window, allocation):
-        
-        self.draw_background()
+
+        if self.frame is not None and self.frame.get_width() != allocation.width:
+            self.drop_frame()
+
+        if self.frame is None:
+            self.draw_background()
+        else:
+            self._background_ready = False
 
 
 class Panel(cream.Module):
@@ -184,29 +279,60 @@ class Panel(cream.Module):
 
     def __init__(self):
 
-        cream.Module.__init__(self, 'org.cream.SimplePanel')
+        self.profiler = get_profiler()
+
+        with self.profiler.phase('module'):
+            cream.Module.__init__(self, 'org.cream.SimplePanel')
 
         # Load themes and applets...
         applets_dirs = [
             os.path.join(self.context.get_path(), 'data/applets'),
             os.path.join(self.context.get_user_path(), 'data/applets')
             ]
-        self.applets = cream.manifest.ManifestDB(applets_dirs, 'org.cream.simplepanel.Applet')
-        self.layout = copy_layout(self.config.layout)
+        with self.profiler.phase('manifests'):
+            self.applets = ManifestIndex(applets_dirs, 'org.cream.simplepanel.Applet')
+        self.layout_store = LayoutStore(os.path.join(self.context.get_user_path(), LAYOUT_FILE))
+        self.layout = self.layout_store.load(self.config.layout)
+        self.loader = get_loader()
+        self.stats = AppletStats()
+        self.watchdog = MainLoopWatchdog(self.stats.get_id, self.config.stall_threshold)
+        self.memory = MemoryAccountant()
+        self.memory_snapshot = None
+        self.applet_surfaces = AppletSurfaceCache(self.stats)
+        self.applet_index = AppletIndex()
+        self.applet_rectangles = {}
+        self.snapshots = SnapshotStore()
+        self.frames = FrameStore()
+        self.pending_applets = deque()
+        self.initializing_applets = set()
+        self.startup_finished = False
+        self.pointer = PointerTracker(self.get_applet_at_coords, self.config.max_fps, self.stats)
+
+        self.scheduler = FrameScheduler(self.config.max_fps)
+        self.scheduler.connect('frame', self.frame_cb)
+        self.config.connect('field-value-changed', self.config_value_changed_cb)
 
         self.screen = wnck.screen_get_default()
-        self.screen.connect('viewports-changed', self.viewports_changed_cb)
+        self.maximized_windows = MaximizedWindowIndex(self.screen)
+        self.maximized_windows.connect('changed', lambda *args: self.handle_fullscreen_windows())
+
+        with self.profiler.phase('window'):
+            self.window = PanelWindow(self.context.get_path(), self.frames, self.get_layout_digest())
+            self.window.show_all()
 
-        self.window = PanelWindow(self.context.get_path())
-        self.window.show_all()
+        # 'changed' is only emitted for windows changing later on.
+        self.handle_fullscreen_windows()
 
         self.window.connect('expose-event', self.expose_cb)
+        self.window.overlay.get_labels = self.get_overlay_labels
+        self.window.set_debug_overlay(self.config.debug_overlay)
+        self.memory.add_root(self.get_memory_roots)
         self.window.connect('button-release-event', self.click_cb)
         self.window.connect('motion-notify-event', self.mouse_motion_cb)
         self.window.connect('enter-notify-event', self.mouse_enter_cb)
         self.window.connect('leave-notify-event', self.mouse_leave_cb)
         self.window.connect('scroll-event', self.scroll_cb)
-        self.window.connect('size-allocate', lambda *args: self.relayout())
+        self.window.connect('size-allocate', lambda *args: self.scheduler.request_relayout())
 
         self.item_add = gtk.ImageMenuItem(gtk.STOCK_ADD)
         self.item_add.get_children()[0].set_label('Add applet')
@@ -216,58 +342,275 @@ class Panel(cream.Module):
         self.menu.append(self.item_add)
         self.menu.show_all()
 
-        applets = sorted(self.applets.get(),key=itemgetter('name'))
-        self.add_dialog = AddAppletDialog(applets)
+        with self.profiler.phase('add_dialog'):
+            applets = sorted(self.applets.get_all(),key=itemgetter('name'))
+            self.add_dialog = AddAppletDialog(applets)
 
 
-        gobject.timeout_add(200, self.handle_fullscreen_windows)
-
         self.load_applets()
 
-        self.save_layout()
+        gobject.timeout_add_seconds(SNAPSHOT_INTERVAL, self.save_snapshots)
+        add_signal_handler(signal.SIGUSR1, self.dump_stats)
+        add_signal_handler(signal.SIGTERM, self.quit)
 
+        self.watchdog.start()
 
-    def save_layout(self):
 
-        self.config.layout = copy_layout(self.layout)
+    def save_layout(self):
+        self.layout_store.save(self.layout)
 
 
     def load_applets(self):
+        """
+        Fill every slot with a placeholder painting the applet's last
+        snapshot and activate the real applets one by one afterwards.
+        Applets without a snapshot are activated first.
+        """
 
-        for group_n, group in enumerate(self.layout):
-            for obj_n, obj in enumerate(group['objects']):
-                if obj['type'] == 'applet':
-                    applet_class = self.load_applet(obj['id'])
-                    applet = applet_class()
-                    self.layout[group_n]['objects'][obj_n]['instance'] = applet
+        pending = []
 
-                    applet.allocate(24)
+        for group_n, group in enumerate(self.layout):
+            for slot in group.applets:
+                snapshot = self.snapshots.load(slot.id)
+                slot.instance = PlaceholderApplet(snapshot, 24)
+                pending.append((snapshot is not None, group_n, slot))
 
-                    applet.connect('render-request', self.render_request_cb)
-                    applet.connect('allocation-changed', lambda *args: self.relayout())
+        pending.sort(key=itemgetter(0))
+        self.pending_applets.extend((group_n, slot) for _, group_n, slot in pending)
 
+        self.layout.update_instances()
         self.relayout()
 
+        gobject.idle_add(self.activate_next_applet, priority=gobject.PRIORITY_LOW)
+        # Don't keep showing the persisted frame if an applet takes forever
+        # to initialize, the placeholders show its snapshot anyway.
+        gobject.timeout_add_seconds(STARTUP_TIMEOUT, self.startup_timeout_cb)
 
-    def load_applet(self, applet_id):
 
-        path = list(self.applets.get(id=applet_id))[0]['path']
-
-        applet_file = os.path.join(path, '__init__.py')
-        applet_name = applet_id.split('.')[-1]
-        if os.path.isfile(applet_file):
-            sys.path.insert(0, path)
-            imp.load_module(
-                'applet_{0}'.format(applet_name),
-                open(applet_file),
-                applet_file,
-                ('.py', 'r', imp.PY_SOURCE)
-            )
-            del sys.path[0]
-            applet = simplepanel.applet.APPLETS[applet_file]
-            return applet
+    def activate_next_applet(self):
+
+        if self.pending_applets:
+            group_n, slot = self.pending_applets.popleft()
+            # A broken applet keeps its placeholder, the others still start.
+            try:
+                self.activate_applet(group_n, slot)
+            except Exception:
+                logger.exception("Could not activate applet %s", slot.id)
+
+        if not self.pending_applets:
+            self.check_startup_finished()
+            return False
+
+        return True
+
+
+    def check_startup_finished(self):
+
+        if self.startup_finished:
+            return
+
+        if not self.pending_applets and not self.initializing_applets:
+            self.startup_finished = True
+            self.window.drop_frame()
+            if self.profiler.enabled:
+                # Let the applets render once before finishing the profile.
+                gobject.idle_add(self.finish_profile, priority=gobject.PRIORITY_LOW)
+
+
+    def finish_profile(self):
+        """ Finish the startup profile and show its summary on the panel for a while. """
+
+        self.profiler.finish()
+        self.window.overlay.set_status(self.profiler.get_status())
+        return False
+
+
+    def startup_timeout_cb(self):
+
+        self.window.drop_frame()
+        return False
+
+
+    def activate_applet(self, group_n, slot):
+        """
+        Construct and initialize the applet of `slot`. Applets keep their
+        placeholder until they are ready, so all applets needing
+        asynchronous initialization initialize concurrently.
+        """
+
+        if slot.isolated:
+            with self.profiler.phase('construct', applet=slot.id):
+                applet = self.load_remote_applet(slot.id)
         else:
-            return None
+            with self.profiler.phase('import', applet=slot.id):
+                applet_class = self.load_applet(slot.id)
+            with self.profiler.phase('construct', applet=slot.id):
+                applet = applet_class()
+
+        self.initializing_applets.add(applet)
+        applet.connect('ready', lambda applet: self.applet_ready_cb(applet, group_n, slot))
+        try:
+            applet.start_init()
+        except Exception:
+            self.initializing_applets.discard(applet)
+            raise
+
+
+    def applet_ready_cb(self, applet, group_n, slot):
+
+        self.initializing_applets.discard(applet)
+        self.swap_in_applet(applet, group_n, slot)
+        self.check_startup_finished()
+
+
+    def swap_in_applet(self, applet, group_n, slot):
+        """ Replace the placeholder of `slot` with `applet`. """
+
+        placeholder = slot.instance
+        slot.instance = applet
+        self.stats.register(applet, slot.id)
+
+        with self.profiler.phase('allocate', applet=slot.id):
+            start = time.time()
+            applet.allocate(24)
+            self.stats.record(applet, 'allocate', start)
+
+        applet.connect('render-request', self.render_request_cb)
+        applet.connect('allocation-changed', lambda applet, allocation, group_n=group_n: self.scheduler.request_relayout(group_n))
+
+        # Make the next relayout repaint the area covered by the placeholder.
+        self.applet_surfaces.discard(placeholder)
+        rectangle = self.applet_rectangles.pop(placeholder, None)
+        if rectangle is not None:
+            self.applet_rectangles[applet] = rectangle
+        if self.pointer.hovered is placeholder:
+            self.pointer.reset()
+        placeholder.destroy()
+
+        self.layout.update_instances()
+        self.scheduler.request_relayout(group_n)
+        self.scheduler.request_render(applet)
+
+
+    def save_snapshots(self):
+        """ Persist the surfaces of all applets rendered since the last call. """
+
+        rendered = self.applet_surfaces.pop_rendered()
+
+        for group in self.layout:
+            for slot in group.applets:
+                applet = slot.instance
+                if applet not in rendered or getattr(applet, 'provides_surface', False):
+                    continue
+                surface = self.applet_surfaces.peek(applet)
+                if surface is not None:
+                    self.snapshots.save(slot.id, surface, applet.get_allocation())
+
+        if rendered and not self.pending_applets and self.window.frame is None:
+            self.save_frame()
+
+        return True
+
+
+    def get_applet_stats(self):
+        """ Return the latency summaries of all calls into applets, see `AppletStats`. """
+
+        return self.stats.get_summary()
+
+
+    def get_stall_stats(self):
+        """ Return the main loop stalls per applet id, see `MainLoopWatchdog`. """
+
+        return self.watchdog.get_summary()
+
+
+    def get_memory_roots(self):
+        """ The panel's own pixel data for the `MemoryAccountant`. """
+
+        for applet in self.layout.instances:
+            applet_id = self.stats.get_id(applet)
+            if applet_id is None:
+                yield ('panel', 'snapshots', applet)
+            else:
+                yield (applet_id, 'surface-cache', self.applet_surfaces.peek(applet))
+
+        yield ('panel', 'theme', self.window.theme_cache)
+        yield ('panel', 'theme', self.window.theme)
+        yield ('panel', 'chrome', self.window.chrome)
+        yield ('panel', 'frame', self.window.frame)
+
+
+    def get_memory_snapshot(self):
+        """ Return a `MemorySnapshot` of the panel and all active applets. """
+
+        applets = [(self.stats.get_id(applet), applet)
+                   for applet in self.layout.instances
+                   if self.stats.get_id(applet) is not None]
+        return self.memory.take_snapshot(applets)
+
+
+    def report_memory(self):
+        """ Log the memory used per applet and what changed since the last report. """
+
+        snapshot = self.get_memory_snapshot()
+        logger.info("Memory usage:\n%s", snapshot.format(self.memory_snapshot))
+        self.memory_snapshot = snapshot
+
+
+    def dump_stats(self):
+        """
+        Write the applet latencies to the user cache and log the memory
+        usage, triggered by `SIGUSR1`.
+        """
+
+        self.stats.save()
+        self.report_memory()
+        return False
+
+
+    def shutdown(self):
+        """ Write everything kept for the next start or for inspection. """
+
+        self.layout_store.flush()
+        self.stats.save()
+
+        # Cancel the applets' background tasks and stop their host processes.
+        for applet in self.layout.instances:
+            applet.destroy()
+
+
+    def get_layout_digest(self):
+        return hashlib.sha1(json.dumps(self.layout.to_list(), sort_keys=True)).hexdigest()
+
+
+    def save_frame(self):
+        """ Persist the fully composited panel for the next start. """
+
+        width, height = self.window.get_size()
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        ctx = cairo.Context(surface)
+
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_surface(self.window.chrome.get_surface(self.window.get_fade()))
+        ctx.paint()
+
+        ctx.set_operator(cairo.OPERATOR_OVER)
+        pipeline.composite(ctx, self.layout.instances, self.applet_surfaces.get_surface)
+
+        self.frames.save(self.window.get_frame_key(self.get_layout_digest()), surface)
+
+
+    def load_applet(self, applet_id):
+
+        path = self.applets.get(applet_id)['path']
+        return self.loader.load(path, applet_id)
+
+
+    def load_remote_applet(self, applet_id):
+
+        path = self.applets.get(applet_id)['path']
+        return RemoteApplet(path, applet_id, self.window.get_size()[0], 24)
 
 
     def add_applet(self):
@@ -279,54 +622,30 @@ class Panel(cream.Module):
         self.add_dialog.dialog.hide()
 
 
-    def relayout(self):
+    def relayout(self, groups=None):
+        """
+        Recompute the applet positions of the given groups (all groups by
+        default). A full relayout repaints the whole panel, otherwise only
+        the rectangles of applets which moved or changed their size are
+        invalidated.
+        """
 
-        position = 0
+        width, height = self.window.get_size()
+        damage = pipeline.relayout(self.layout, width, self.applet_rectangles, groups)
 
-        for group_n, group in enumerate(self.layout):
-            orientation = group['orientation']
-
-            if orientation == 'right':
-                position = self.window.get_size()[0] - group['position']
-                objects = group['objects']
-                objects.reverse()
-            elif orientation == 'left':
-                position = group['position']
-                objects = group['objects']
-            for obj_n, obj in enumerate(objects):
-                if obj['type'] == 'applet':
-                    applet = obj['instance']
-                    if orientation == 'right':
-                        position -= applet.get_allocation()[0]
-                        applet.set_position(position, 0)
-                    elif orientation == 'left':
-                        applet.set_position(position, 0)
-                        position += applet.get_allocation()[0]
-                elif obj['type'] == 'space':
-                    if orientation == 'right':
-                        position -= obj['size']
-                    elif orientation == 'left':
-                        position += obj['size']
-            if orientation == 'right':
-                objects.reverse()
-
-        self.window.window.invalidate_rect(gtk.gdk.Rectangle(0, 0, self.window.get_size()[0],self.window.get_size()[1]), True)
+        self.applet_index.rebuild(self.layout.instances)
 
+        if groups is None:
+            self.window.invalidate(gtk.gdk.Rectangle(0, 0, width, height))
+        else:
+            region = gtk.gdk.Region()
+            for rectangle in damage:
+                region.union_with_rect(gtk.gdk.Rectangle(*rectangle))
+            self.window.invalidate_region(region)
 
-    def get_applet_at_coords(self, x, y):
 
-        for group_n, group in enumerate(self.layout):
-            orientation = group['orientation']
-            position = group['position']
-            for obj_n, obj in enumerate(group['objects']):
-                if obj['type'] == 'applet':
-                    applet = obj['instance']
-                    w, h = applet.get_allocation()
-                    x0, y0 = applet.get_position()
-                    x1, y1 = x0 + w, y0 + h
-                    if x >= x0 and x <= x1 and y >= y0 and y <= y1:
-                        return applet
-        return None
+    def get_applet_at_coords(self, x, y):
+        return self.applet_index.get_applet_at_coords(x, y)
 
 
     def click_cb(self, window, event):
@@ -337,113 +656,149 @@ class Panel(cream.Module):
             else:
                 x = event.x - applet.get_position()[0]
                 y = event.y - applet.get_position()[1]
+                start = time.time()
                 applet.emit('click', x, y)
+                self.stats.record(applet, 'click', start)
         elif event.button == MOUSE_BUTTON_RIGHT:
             self.menu.popup(None, None, None, event.button, event.get_time())
 
 
     def mouse_motion_cb(self, window, event):
-        applet = self.get_applet_at_coords(event.x, event.y)
-        if applet:
-            offset_x, offset_y = applet.get_position()
-            applet.emit('mouse-motion', event.x - offset_x, event.y - offset_y)
+
+        # The position of a hint can be stale, ask for the current one.
+        if event.is_hint:
+            x, y, state = event.window.get_pointer()
+        else:
+            x, y = event.x, event.y
+        self.pointer.motion(x, y)
+        # The window only asked for motion hints, request the next one.
+        event.request_motions()
 
 
     def mouse_enter_cb(self, window, event):
-        applet = self.get_applet_at_coords(event.x, event.y)
-        if applet:
-            offset_x, offset_y = applet.get_position()
-            applet.emit('mouse-enter', event.x - offset_x, event.y - offset_y)
+        self.pointer.enter(event.x, event.y)
 
 
     def mouse_leave_cb(self, window, event):
-        applet = self.get_applet_at_coords(event.x, event.y)
-        if applet:
-            offset_x, offset_y = applet.get_position()
-            applet.emit('mouse-leave', event.x - offset_x, event.y - offset_y)
+        self.pointer.leave(event.x, event.y)
 
 
     def scroll_cb(self, window, event):
         applet = self.get_applet_at_coords(event.x, event.y)
         if applet:
            offset_x, offset_y = applet.get_position()
+           start = time.time()
            applet.emit('scroll', event.x - offset_x, event.y - offset_y, event.direction)
+           self.stats.record(applet, 'scroll', start)
 
 
 
     def handle_fullscreen_windows(self):
 
-        windows = self.screen.get_windows()
-        workspace = self.screen.get_active_workspace()
-        for w in windows:
-            if w.is_maximized() and w.is_in_viewport(workspace):
-                if self.window.get_alpha()[0] == .5:
+        if self.maximized_windows.has_maximized():
+            if self.window.get_fade() == 0:
 
-                    def update(t, state):
-                        self.window.set_alpha(.5 + state * .5, 1 - state)
-                        self.window.window.invalidate_rect(gtk.gdk.Rectangle(0, 0, self.window.get_size()[0],self.window.get_size()[1]), True)
+                def update(t, state):
+                    self.window.set_fade(state)
+                    self.scheduler.request_redraw()
+                    self.fade_update(state)
 
-                    t = cream.gui.Timeline(FADE_DURATION, cream.gui.CURVE_SINE)
-                    t.connect('update', update)
-                    t.run()
-                break
+                t = cream.gui.Timeline(FADE_DURATION, cream.gui.CURVE_SINE)
+                t.connect('update', update)
+                t.run()
         else:
-            if self.window.get_alpha()[0] == 1:
+            if self.window.get_fade() == 1:
 
                 def update(t, state):
-                    self.window.set_alpha(1 - state * .5, state)
-                    self.window.window.invalidate_rect(gtk.gdk.Rectangle(0, 0, self.window.get_size()[0],self.window.get_size()[1]), True)
+                    self.window.set_fade(1 - state)
+                    self.scheduler.request_redraw()
+                    self.fade_update(state)
 
                 t = cream.gui.Timeline(FADE_DURATION, cream.gui.CURVE_SINE)
                 t.connect('update', update)
                 t.run()
 
-        return True
 
+    def fade_update(self, state):
+
+        # Changes during a fade are ignored, check again once it has finished.
+        if state >= 1:
+            gobject.idle_add(self.handle_fullscreen_windows)
 
-    def viewports_changed_cb(self, screen):
-        self.handle_fullscreen_windows()
 
+    def expose_cb(self, window, event):
 
-    def expose_cb(self, *args):
+        # The persisted frame already contains the applets.
+        if self.window.frame is not None:
+            return
 
         ctx = self.window.window.cairo_create()
 
-        for group_n, group in enumerate(self.layout):
-            orientation = group['orientation']
-            position = group['position']
-            for obj_n, obj in enumerate(group['objects']):
-                if obj['type'] == 'applet':
-                    applet = obj['instance']
+        ctx.region(event.region)
+        ctx.clip()
+
+        def get_surface(applet):
+            if self.profiler.enabled and self.stats.get_id(applet) is not None:
+                with self.profiler.phase('render', applet=self.stats.get_id(applet)):
+                    return self.applet_surfaces.get_surface(applet)
+            return self.applet_surfaces.get_surface(applet)
+
+        pipeline.composite(ctx, self.layout.instances, get_surface,
+                  lambda rectangle: intersects(event.region, gtk.gdk.Rectangle(*rectangle)))
+
 
-                    ctx.save()
-                    x, y = applet.get_position()
-                    width, height = applet.get_allocation()
-                    ctx.translate(x, y)
-                    ctx.rectangle(0, 0, width, height)
-                    ctx.clip()
+    def get_overlay_labels(self):
+        """ Label every applet with the duration of its last render. """
 
-                    applet.render(ctx)
-                    ctx.restore()
+        labels = []
+        for applet in self.layout.instances:
+            duration = self.stats.get_last(applet, 'render')
+            if duration is not None:
+                labels.append((applet_rectangle(applet), '{0:.2f} ms'.format(duration * 1000)))
+        return labels
 
 
     def render_request_cb(self, applet):
 
-        x, y = applet.get_position()
-        width, height = applet.get_allocation()
+        self.applet_surfaces.invalidate(applet)
+        self.scheduler.request_render(applet)
 
-        self.window.window.invalidate_rect(gtk.gdk.Rectangle(int(x), int(y), int(width), int(height)), True)
 
-        # What the heck? TODO: Check.
-        #ctx = self.window.window.cairo_create()
+    def frame_cb(self, scheduler, relayout, redraw, applets):
+
+        if self.window.overlay.enabled:
+            self.window.overlay.add_frame()
+
+        if None in relayout:
+            self.relayout()
+            return
+        elif relayout:
+            self.relayout(relayout)
+
+        if redraw:
+            width, height = self.window.get_size()
+            self.window.invalidate(gtk.gdk.Rectangle(0, 0, width, height))
+        else:
+            for applet in applets:
+                self.window.invalidate(applet_rectangle(applet))
+
 
-        #ctx.translate(x, y)
-        #ctx.rectangle(0, 0, width, height)
-        #ctx.clip()
-        #applet.render(ctx)
+    def config_value_changed_cb(self, config, field, value):
 
+        if field == 'max_fps':
+            self.scheduler.set_max_fps(value)
+            self.pointer.set_max_fps(value)
+        elif field == 'debug_overlay':
+            self.window.set_debug_overlay(value)
+        elif field == 'stall_threshold':
+            self.watchdog.set_threshold(value)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    configure_profiler(sys.argv)
     panel = Panel()
-    panel.main()
+    try:
+        panel.main()
+    finally:
+        panel.shutdown()
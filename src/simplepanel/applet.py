@@ -23,11 +23,16 @@ import gobject
 import gtk
 import threading
 import tempfile
+import logging
 
 import cream.base
 
+from simplepanel.executor import get_executor
+
 APPLETS = dict()
 
+logger = logging.getLogger(__name__)
+
 class Applet(gobject.GObject, cream.base.Component):
 
     __gtype_name__ = 'Applet'
@@ -38,15 +43,22 @@ class Applet(gobject.GObject, cream.base.Component):
         'mouse-motion': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_INT, gobject.TYPE_INT)),
         'mouse-enter': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_INT, gobject.TYPE_INT)),
         'mouse-leave': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_INT, gobject.TYPE_INT)),
-        'scroll': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_INT, gobject.TYPE_INT, gobject.TYPE_PYOBJECT))
+        'scroll': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_INT, gobject.TYPE_INT, gobject.TYPE_PYOBJECT)),
+        'ready': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, ())
         }
 
+    # Applets doing expensive or blocking work on startup set this and move
+    # that work from the constructor into `init_async`.
+    needs_async_init = False
+
     def __init__(self):
 
         gobject.GObject.__init__(self)
         cream.base.Component.__init__(self)
         self.allocation = None
         self.position = None
+        self.ready = False
+        self._tasks = set()
 
         self.menu = gtk.Menu()
 
@@ -57,6 +69,74 @@ class Applet(gobject.GObject, cream.base.Component):
         self.menu.show_all()
 
 
+    def start_init(self):
+        """
+        Called by the panel right after construction. Emits `ready` at once
+        unless the applet needs asynchronous initialization, in which case
+        `init_async` is run in a worker thread and `init_finish` is called
+        with its result on the main loop before `ready` is emitted.
+        """
+
+        if self.needs_async_init:
+            self.run_in_background(self.init_async, self._init_done_cb, self._init_failed_cb)
+        else:
+            self.set_ready()
+
+
+    def init_async(self):
+        """ Runs in a worker thread, must not touch GTK. """
+
+        pass
+
+
+    def init_finish(self, result):
+        pass
+
+
+    def set_ready(self):
+
+        if not self.ready:
+            self.ready = True
+            self.emit('ready')
+
+
+    def _init_done_cb(self, result):
+
+        try:
+            self.init_finish(result)
+        except Exception, e:
+            self._init_failed_cb(e)
+        finally:
+            self.set_ready()
+
+
+    def _init_failed_cb(self, error):
+
+        logger.error("Asynchronous initialization of %s failed: %s", type(self).__name__, error)
+        self.set_ready()
+
+
+    def run_in_background(self, func, callback=None, error_callback=None):
+        """
+        Run `func` in the shared worker pool. `callback` is called with the
+        result on the main loop, so it may safely touch GTK. Pending tasks are
+        cancelled when the applet is destroyed.
+        """
+
+        task = get_executor().submit(func, callback, error_callback)
+        task.done_callbacks.append(self._tasks.discard)
+        self._tasks.add(task)
+
+        return task
+
+
+    def destroy(self):
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+
     def show_menu(self):
         self.menu.popup(None, None, None, 0, 0)
 
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import gtk
+import cairo
+
+from simplepanel.pipeline import SurfaceCache, surface_size, get_rectangle
+
+FADE_STEPS = 16
+
+
+def applet_rectangle(applet):
+    """ Return the smallest integral `gtk.gdk.Rectangle` covering the given applet. """
+
+    return gtk.gdk.Rectangle(*get_rectangle(applet))
+
+
+def get_fade_alpha(progress):
+    """
+    Return the `(background, shadow)` alpha for a fade `progress` between 0
+    (no maximized window) and 1 (a maximized window on the workspace).
+    """
+
+    return (.5 + progress * .5, 1 - progress)
+
+
+def intersects(region, rectangle):
+    """ Check whether `rectangle` is at least partially inside `region`. """
+
+    return region.rect_in(rectangle) != gtk.gdk.OVERLAP_RECTANGLE_OUT
+
+
+class AppletSurfaceCache(SurfaceCache):
+    """ A `SurfaceCache` handing GDK cairo contexts to the applets. """
+
+    def create_context(self, surface):
+        return gtk.gdk.CairoContext(cairo.Context(surface))
+
+
+class ChromeCache(object):
+    """
+    Pre-composited panel chrome.
+
+    Background, shadow and border are composited into a single surface
+    once for every quantized fade progress, so an expose boils down to a
+    single blit. All `steps + 1` states of a fade fit into the cache, so
+    back-to-back fades only hit; `trim` drops everything but the resting
+    states once no fade is expected anymore.
+    """
+
+    def __init__(self, steps=FADE_STEPS):
+
+        self.steps = steps
+
+        self._layers = None
+        self._entries = {}
+
+
+    def set_layers(self, background, shadow, border):
+        """ Replace the source layers and drop everything composited so far. """
+
+        if self._layers == (background, shadow, border):
+            return
+
+        self._layers = (background, shadow, border)
+        self._entries.clear()
+
+
+    def quantize(self, progress):
+        return int(round(min(max(progress, 0), 1) * self.steps))
+
+
+    def get_surface(self, progress):
+
+        key = self.quantize(progress)
+
+        surface = self._entries.get(key)
+        if surface is None:
+            surface = self._composite(*get_fade_alpha(float(key) / self.steps))
+            self._entries[key] = surface
+
+        return surface
+
+
+    def trim(self):
+        """ Drop the intermediate states of a fade. """
+
+        for key in self._entries.keys():
+            if key not in (0, self.steps):
+                del self._entries[key]
+
+
+    def _composite(self, bg, sdw):
+
+        background, shadow, border = self._layers
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                     background.get_width(),
+                                     background.get_height())
+        ctx = cairo.Context(surface)
+
+        ctx.set_operator(cairo.OPERATOR_OVER)
+
+        ctx.set_source_surface(background)
+        ctx.paint_with_alpha(bg)
+
+        ctx.set_source_surface(shadow)
+        ctx.paint_with_alpha(sdw)
+
+        ctx.set_source_surface(border)
+        ctx.paint()
+
+        return surface
+
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import sys
+import threading
+import logging
+import Queue
+
+from collections import deque
+
+import gobject
+
+MAX_WORKERS = 4
+
+_executor = None
+
+logger = logging.getLogger(__name__)
+
+
+class Task(object):
+    """ A function queued for execution in the background. """
+
+    def __init__(self, func, callback=None, error_callback=None):
+
+        self.func = func
+        self.callback = callback
+        self.error_callback = error_callback
+
+        self.cancelled = False
+        self.done = False
+        self.done_callbacks = []
+
+
+    def cancel(self):
+        """
+        Drop the task, its callbacks will not be called anymore. It is still
+        marked done and its `done_callbacks` are run.
+        """
+
+        self.cancelled = True
+
+
+class Executor(object):
+    """
+    A bounded pool of worker threads.
+
+    Functions are run by at most `max_workers` threads. Their results are
+    handed back to the GTK main loop: all results finished in the meantime
+    are delivered in one batch from a single idle callback, so callbacks may
+    safely touch GTK.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+
+        gobject.threads_init()
+
+        self.max_workers = max_workers
+
+        self._tasks = Queue.Queue()
+        self._results = deque()
+        self._lock = threading.Lock()
+        self._idle_source = None
+        self._workers = []
+        self._idle_workers = 0
+
+
+    def submit(self, func, callback=None, error_callback=None):
+
+        task = Task(func, callback, error_callback)
+
+        with self._lock:
+            if not self._idle_workers and len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+
+        self._tasks.put(task)
+
+        return task
+
+
+    def _work(self):
+
+        while True:
+            with self._lock:
+                self._idle_workers += 1
+            task = self._tasks.get()
+            with self._lock:
+                self._idle_workers -= 1
+
+            if task.cancelled:
+                result = (task, None, None)
+            else:
+                try:
+                    result = (task, task.func(), None)
+                except Exception:
+                    result = (task, None, sys.exc_info())
+
+            with self._lock:
+                self._results.append(result)
+                if self._idle_source is None:
+                    self._idle_source = gobject.idle_add(self._deliver)
+
+
+    def _deliver(self):
+
+        with self._lock:
+            results = list(self._results)
+            self._results.clear()
+            self._idle_source = None
+
+        # A failing callback must not keep the rest of the batch from
+        # being delivered.
+        for task, value, exc_info in results:
+            try:
+                if task.cancelled:
+                    pass
+                elif exc_info is None:
+                    if task.callback is not None:
+                        task.callback(value)
+                elif task.error_callback is not None:
+                    task.error_callback(exc_info[1])
+                else:
+                    logger.error("Background task failed", exc_info=exc_info)
+            except Exception:
+                logger.exception("Callback of a background task failed")
+            finally:
+                task.done = True
+                for done_callback in task.done_callbacks:
+                    try:
+                        done_callback(task)
+                    except Exception:
+                        logger.exception("Done callback of a background task failed")
+
+        return False
+
+
+def get_executor():
+    """ Return the executor shared by the panel and all applets. """
+
+    global _executor
+    if _executor is None:
+        _executor = Executor()
+    return _executor
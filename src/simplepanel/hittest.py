@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+from bisect import bisect_right
+
+
+class AppletIndex(object):
+    """
+    Sorted interval index over the horizontal extents of the applets.
+
+    The index has to be rebuilt whenever applets are moved (i.e. in
+    `Panel.relayout`). Lookups bisect the sorted start coordinates and check
+    the applet hit last time first, as consecutive pointer events usually
+    land on the same applet.
+    """
+
+    def __init__(self):
+
+        self._starts = []
+        self._ends = []
+        self._tops = []
+        self._bottoms = []
+        self._applets = []
+
+        self._last = -1
+
+
+    def rebuild(self, applets):
+
+        extents = []
+        for applet in applets:
+            x, y = applet.get_position()
+            width, height = applet.get_allocation()
+            extents.append((x, x + width, y, y + height, applet))
+        extents.sort(key=lambda extent: extent[0])
+
+        self._starts = [e[0] for e in extents]
+        self._ends = [e[1] for e in extents]
+        self._tops = [e[2] for e in extents]
+        self._bottoms = [e[3] for e in extents]
+        self._applets = [e[4] for e in extents]
+
+        self._last = -1
+
+
+    def get_applet_at_coords(self, x, y):
+
+        i = self._last
+        if i >= 0 and self._hit(i, x, y):
+            return self._applets[i]
+
+        i = bisect_right(self._starts, x) - 1
+        if i >= 0 and self._hit(i, x, y):
+            self._last = i
+            return self._applets[i]
+
+        return None
+
+
+    def _hit(self, i, x, y):
+        return self._starts[i] <= x <= self._ends[i] and self._tops[i] <= y <= self._bottoms[i]
+
+
+    def __len__(self):
+        return len(self._applets)
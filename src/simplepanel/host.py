@@ -0,0 +1,440 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+"""
+Out-of-process applet hosting.
+
+An isolated applet runs in its own process (`python -m simplepanel.host`)
+and renders into one of two ARGB32 buffers in memory-mapped files shared
+with the panel. The panel side is represented by a `RemoteApplet`, which
+offers the same interface as `simplepanel.applet.Applet`: it composites the
+shared buffer directly and forwards input signals to the host over a socket.
+Messages are newline separated JSON objects.
+
+A buffer announced by the host belongs to the panel until the panel sends it
+back with a `release` message, which it does as soon as a newer buffer
+arrives. The host unlinks the buffer files once it has mapped them, so they
+do not outlive the processes.
+"""
+
+import os
+import sys
+import json
+import fcntl
+import logging
+import mmap
+import socket
+import tempfile
+import subprocess
+
+from collections import deque
+
+import gobject
+import gtk
+import cairo
+
+import simplepanel.applet
+from simplepanel.compositor import surface_size
+from simplepanel.loader import get_loader
+
+BUFFERS = 2
+SHM_DIR = '/dev/shm'
+
+logger = logging.getLogger(__name__)
+
+
+def get_stride(width):
+    return width * 4
+
+
+def create_shared_buffers(width, height):
+    """
+    Create the files backing the shared buffers and return their paths and
+    mappings. Every buffer gets its own file so it can be handed to cairo
+    as a whole.
+    """
+
+    directory = SHM_DIR if os.path.isdir(SHM_DIR) else None
+    size = get_stride(width) * height
+
+    paths, buffers = [], []
+    for i in xrange(BUFFERS):
+        fd, path = tempfile.mkstemp(prefix='simplepanel-', dir=directory)
+        os.ftruncate(fd, size)
+        buffers.append(mmap.mmap(fd, size))
+        paths.append(path)
+        os.close(fd)
+
+    return paths, buffers
+
+
+def open_shared_buffers(paths, width, height):
+    """ Map the buffers created by the panel and remove their files. """
+
+    size = get_stride(width) * height
+
+    buffers = []
+    for path in paths:
+        fd = os.open(path, os.O_RDWR)
+        buffers.append(mmap.mmap(fd, size))
+        os.close(fd)
+        os.remove(path)
+
+    return buffers
+
+
+def set_cloexec(fd):
+
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+
+class Connection(object):
+    """ Line based JSON messages over a stream socket. """
+
+    def __init__(self, sock, message_cb, hangup_cb):
+
+        self.sock = sock
+        self.message_cb = message_cb
+        self.hangup_cb = hangup_cb
+
+        self._buffer = ''
+        self._watch = gobject.io_add_watch(self.sock, gobject.IO_IN | gobject.IO_HUP | gobject.IO_ERR, self._io_cb)
+
+
+    def send(self, **message):
+
+        try:
+            self.sock.sendall(json.dumps(message) + '\n')
+        except socket.error:
+            pass
+
+
+    def close(self):
+
+        if self._watch is not None:
+            gobject.source_remove(self._watch)
+            self._watch = None
+        self.sock.close()
+
+
+    def _io_cb(self, source, condition):
+
+        data = ''
+        if condition & gobject.IO_IN:
+            try:
+                data = self.sock.recv(4096)
+            except socket.error:
+                data = ''
+
+        if not data:
+            # Returning False removes the watch.
+            self._watch = None
+            self.hangup_cb()
+            return False
+
+        self._buffer += data
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            self.message_cb(json.loads(line))
+
+        return True
+
+
+class RemoteApplet(gobject.GObject):
+    """ Panel side proxy of an applet running in a host process. """
+
+    __gtype_name__ = 'RemoteApplet'
+    __gsignals__ = simplepanel.applet.Applet.__gsignals__
+
+    provides_surface = True
+
+    def __init__(self, applet_path, applet_id, max_width, max_height):
+
+        gobject.GObject.__init__(self)
+
+        self.applet_id = applet_id
+        self.allocation = (0, max_height)
+        self.position = None
+        self.ready = False
+
+        self.max_width = max_width
+        self.max_height = max_height
+
+        self._surface = None
+        self._buffer = None
+        self._destroyed = False
+
+        self.shm_paths, self.buffers = create_shared_buffers(max_width, max_height)
+
+        # The host gets its end of the socket as stdin and nothing else, so
+        # it sees EOF as soon as the panel is gone.
+        panel_sock, host_sock = socket.socketpair()
+        set_cloexec(panel_sock.fileno())
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'simplepanel.host',
+             applet_path, applet_id,
+             str(max_width), str(max_height)] + self.shm_paths,
+            stdin=host_sock,
+            close_fds=True
+            )
+        host_sock.close()
+
+        self.connection = Connection(panel_sock, self.message_cb, self.hangup_cb)
+
+        self.connect('click', lambda applet, x, y: self.connection.send(type='click', x=x, y=y))
+        self.connect('scroll', lambda applet, x, y, direction: self.connection.send(type='scroll', x=x, y=y, direction=int(direction)))
+        self.connect('mouse-motion', lambda applet, x, y: self.connection.send(type='mouse-motion', x=x, y=y))
+        self.connect('mouse-enter', lambda applet, x, y: self.connection.send(type='mouse-enter', x=x, y=y))
+        self.connect('mouse-leave', lambda applet, x, y: self.connection.send(type='mouse-leave', x=x, y=y))
+
+
+    def message_cb(self, message):
+
+        if message['type'] == 'allocation':
+            self.set_allocation(message['width'], message['height'])
+        elif message['type'] == 'render':
+            # Wrap the buffer the host just finished rendering into, the
+            # pixels themselves are never copied. The previous buffer is
+            # not composited anymore and can be reused by the host.
+            self._surface = cairo.ImageSurface.create_for_data(
+                self.buffers[message['buffer']],
+                cairo.FORMAT_ARGB32,
+                message['width'],
+                message['height'],
+                get_stride(self.max_width)
+                )
+            if self._buffer is not None:
+                self.connection.send(type='release', buffer=self._buffer)
+            self._buffer = message['buffer']
+            self.emit('render-request')
+        elif message['type'] == 'ready':
+            self.set_ready()
+
+
+    def start_init(self):
+        """ The host initializes the applet and reports when it is ready. """
+
+        pass
+
+
+    def set_ready(self):
+
+        if not self.ready:
+            self.ready = True
+            self.emit('ready')
+
+
+    def hangup_cb(self):
+
+        if not self.ready:
+            logger.error("Host process of applet %s exited before the applet was ready", self.applet_id)
+
+        self.destroy()
+
+        # Don't keep the panel waiting for an applet which is gone.
+        self.set_ready()
+
+
+    def destroy(self):
+
+        if self._destroyed:
+            return
+        self._destroyed = True
+
+        self.connection.close()
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+        for path in self.shm_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+    def get_surface(self):
+
+        if self._surface is None:
+            return cairo.ImageSurface(cairo.FORMAT_ARGB32, 0, 0)
+        return self._surface
+
+
+    def show_menu(self):
+        self.connection.send(type='menu')
+
+
+    def draw(self):
+        self.emit('render-request')
+
+
+    def render(self, ctx):
+
+        if self._surface is not None:
+            ctx.set_source_surface(self._surface)
+            ctx.paint()
+
+
+    def set_position(self, x, y):
+
+        self.position = (x, y)
+        self.connection.send(type='position', x=x, y=y)
+
+
+    def get_position(self):
+        return self.position
+
+
+    def set_allocation(self, width, height):
+
+        self.allocation = (width, height)
+        self.emit('allocation-changed', self.get_allocation())
+
+
+    def get_allocation(self):
+        return self.allocation
+
+
+    def reallocate(self):
+        self.allocate(self.get_allocation()[1])
+
+
+    def allocate(self, height):
+
+        self.connection.send(type='allocate', height=height)
+        return self.get_allocation()
+
+
+class AppletHost(object):
+    """ Host process side: runs the applet and renders into the shared buffers. """
+
+    def __init__(self, applet, sock, shm_paths, max_width, max_height):
+
+        self.applet = applet
+
+        self.max_width = max_width
+        self.max_height = max_height
+        self.buffers = open_shared_buffers(shm_paths, max_width, max_height)
+
+        self._free_buffers = deque(xrange(BUFFERS))
+        self._render_source = None
+        self._render_blocked = False
+
+        self.connection = Connection(sock, self.message_cb, gtk.main_quit)
+
+        self.applet.connect('render-request', lambda *args: self.queue_render())
+        self.applet.connect('allocation-changed', self.allocation_changed_cb)
+        self.applet.connect('ready', lambda *args: self.connection.send(type='ready'))
+
+        allocation = self.applet.get_allocation()
+        if allocation is not None:
+            self.allocation_changed_cb(self.applet, allocation)
+
+
+    def message_cb(self, message):
+
+        type_ = message['type']
+
+        if type_ == 'allocate':
+            self.applet.allocate(message['height'])
+        elif type_ == 'position':
+            self.applet.set_position(message['x'], message['y'])
+        elif type_ == 'release':
+            self._free_buffers.append(message['buffer'])
+            if self._render_blocked:
+                self._render_blocked = False
+                self.queue_render()
+        elif type_ == 'menu':
+            self.applet.show_menu()
+        elif type_ == 'scroll':
+            self.applet.emit('scroll', message['x'], message['y'], message['direction'])
+        elif type_ in ('click', 'mouse-motion', 'mouse-enter', 'mouse-leave'):
+            self.applet.emit(type_, message['x'], message['y'])
+
+
+    def allocation_changed_cb(self, applet, allocation):
+
+        width, height = allocation
+        self.connection.send(type='allocation', width=width, height=height)
+        self.queue_render()
+
+
+    def queue_render(self):
+
+        if self._render_source is None:
+            self._render_source = gobject.idle_add(self.render)
+
+
+    def render(self):
+
+        self._render_source = None
+
+        allocation = self.applet.get_allocation()
+        if allocation is None:
+            return False
+
+        # Never touch a buffer the panel may still be compositing, render
+        # once it released one.
+        if not self._free_buffers:
+            self._render_blocked = True
+            return False
+
+        width, height = surface_size(allocation)
+        width = min(width, self.max_width)
+        height = min(height, self.max_height)
+        stride = get_stride(self.max_width)
+
+        index = self._free_buffers.popleft()
+
+        surface = cairo.ImageSurface.create_for_data(self.buffers[index], cairo.FORMAT_ARGB32, width, height, stride)
+        ctx = gtk.gdk.CairoContext(cairo.Context(surface))
+
+        ctx.set_operator(cairo.OPERATOR_CLEAR)
+        ctx.paint()
+        ctx.set_operator(cairo.OPERATOR_OVER)
+
+        ctx.rectangle(0, 0, width, height)
+        ctx.clip()
+        self.applet.render(ctx)
+        surface.flush()
+
+        self.connection.send(type='render', buffer=index, width=width, height=height)
+
+        return False
+
+
+def main(args):
+
+    path, applet_id, max_width, max_height = args[:4]
+    shm_paths = args[4:]
+
+    # The panel passes the socket as stdin.
+    sock = socket.fromfd(0, socket.AF_UNIX, socket.SOCK_STREAM)
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, 0)
+    os.close(null)
+
+    applet_class = get_loader().load(path, applet_id)
+    applet = applet_class()
+
+    host = AppletHost(applet, sock, shm_paths, int(max_width), int(max_height))
+    applet.start_init()
+    gtk.main()
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    main(sys.argv[1:])
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+class AppletSlot(object):
+    """
+    A slot holding an applet. `instance` is set once the applet is loaded,
+    `isolated` applets are run in a host process of their own.
+    """
+
+    __slots__ = ('id', 'instance', 'isolated')
+
+    type = 'applet'
+
+    def __init__(self, id, instance=None, isolated=False):
+
+        self.id = id
+        self.instance = instance
+        self.isolated = isolated
+
+
+    def get_width(self):
+
+        if self.instance is None:
+            return 0
+        return self.instance.get_allocation()[0]
+
+
+    def to_dict(self):
+
+        obj = {'type': self.type, 'id': self.id}
+        if self.isolated:
+            obj['isolated'] = True
+        return obj
+
+
+class SpaceSlot(object):
+    """ A fixed amount of empty space between applets. """
+
+    __slots__ = ('size',)
+
+    type = 'space'
+
+    def __init__(self, size):
+        self.size = size
+
+
+    def get_width(self):
+        return self.size
+
+
+    def to_dict(self):
+        return {'type': self.type, 'size': self.size}
+
+
+SLOT_TYPES = {
+    'applet': lambda obj: AppletSlot(obj['id'], isolated=obj.get('isolated', False)),
+    'space': lambda obj: SpaceSlot(obj['size'])
+    }
+
+
+class LayoutGroup(object):
+    """
+    A group of slots aligned to the left or the right edge of the panel.
+    """
+
+    __slots__ = ('orientation', 'position', 'slots', 'applets')
+
+    def __init__(self, orientation, position, slots):
+
+        self.orientation = orientation
+        self.position = position
+        self.slots = list(slots)
+        self.applets = [slot for slot in self.slots if slot.type == 'applet']
+
+
+    @classmethod
+    def from_dict(cls, group):
+
+        return cls(
+            group['orientation'],
+            group['position'],
+            [SLOT_TYPES[obj['type']](obj) for obj in group['objects']]
+            )
+
+
+    def to_dict(self):
+
+        return {
+            'orientation': self.orientation,
+            'position': self.position,
+            'objects': [slot.to_dict() for slot in self.slots]
+            }
+
+
+    def layout(self, panel_width):
+        """ Compute the slot positions and move the applets accordingly. """
+
+        if self.orientation == 'right':
+            position = panel_width - self.position
+            for slot in reversed(self.slots):
+                position -= slot.get_width()
+                if slot.type == 'applet' and slot.instance is not None:
+                    slot.instance.set_position(position, 0)
+        else:
+            position = self.position
+            for slot in self.slots:
+                if slot.type == 'applet' and slot.instance is not None:
+                    slot.instance.set_position(position, 0)
+                position += slot.get_width()
+
+
+class PanelLayout(object):
+    """
+    The layout of the panel, i.e. a list of `LayoutGroup`s.
+
+    It is (de)serialized from and to the plain list of dictionaries stored in
+    `config.layout` and `applets.json`. `instances` is a flat list of all
+    loaded applets, refreshed by `update_instances`.
+    """
+
+    __slots__ = ('groups', 'instances')
+
+    def __init__(self, groups):
+
+        self.groups = list(groups)
+        self.instances = []
+
+
+    @classmethod
+    def from_list(cls, layout):
+        return cls(LayoutGroup.from_dict(group) for group in layout)
+
+
+    def to_list(self):
+        return [group.to_dict() for group in self.groups]
+
+
+    def update_instances(self):
+
+        self.instances = [slot.instance
+                          for group in self.groups
+                          for slot in group.applets
+                          if slot.instance is not None]
+
+
+    def __iter__(self):
+        return iter(self.groups)
+
+
+    def __len__(self):
+        return len(self.groups)
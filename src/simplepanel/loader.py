@@ -0,0 +1,182 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import sys
+import imp
+import time
+import struct
+import marshal
+import hashlib
+import inspect
+
+import simplepanel.applet
+from simplepanel.util import get_cache_dir, write_atomically
+
+BYTECODE_DIR = get_cache_dir('bytecode')
+MAGIC = imp.get_magic()
+
+
+def read_bytecode(filename, mtime):
+    """ Return the code object stored in `filename` if it was compiled from a source with `mtime`. """
+
+    try:
+        with open(filename, 'rb') as f:
+            header = f.read(8)
+            if len(header) != 8 or header[:4] != MAGIC \
+                or struct.unpack('<I', header[4:])[0] != mtime:
+                return None
+            return marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_bytecode(filename, code, mtime):
+
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', mtime))
+            marshal.dump(code, f)
+
+    write_atomically(filename, write)
+
+
+class AppletLoader(object):
+    """
+    Loads applet modules.
+
+    Applets are executed from bytecode: either the `.pyc` compiled next to the
+    source at install time or a copy in the user's cache, keyed by source path
+    and modification time. The applet directory is turned into a package, so
+    the applet's own modules are imported relative to it without touching
+    `sys.path`. The time needed to load every applet is recorded in `timings`.
+    """
+
+    def __init__(self, cache_dir=BYTECODE_DIR):
+
+        self.cache_dir = cache_dir
+        self.timings = {}
+        self.applet_ids = {}
+
+
+    def load(self, path, applet_id):
+        """
+        Load the applet in `path` and return its class, or `None` if there
+        is no applet. Raises `ImportError` if the applet class is ambiguous.
+        """
+
+        applet_file = os.path.join(path, '__init__.py')
+        if not os.path.isfile(applet_file):
+            return None
+
+        start = time.time()
+
+        module_name = 'applet_{0}'.format(applet_id.split('.')[-1])
+        self.applet_ids[module_name] = applet_id
+        module = sys.modules.get(module_name)
+        if module is None or getattr(module, '__file__', None) != applet_file:
+            module = self._load_module(module_name, path, applet_file)
+
+        applet = self._find_applet(module)
+
+        self.timings[applet_id] = time.time() - start
+
+        return applet
+
+
+    def get_timings(self):
+        return dict(self.timings)
+
+
+    def get_applet_id(self, module_name):
+        """ Return the id of the applet `module_name` belongs to, or `None`. """
+
+        return self.applet_ids.get(module_name.split('.')[0])
+
+
+    def _load_module(self, name, path, applet_file):
+
+        module = imp.new_module(name)
+        module.__file__ = applet_file
+        module.__path__ = [path]
+        sys.modules[name] = module
+
+        try:
+            exec self._get_code(applet_file) in module.__dict__
+        except:
+            del sys.modules[name]
+            raise
+
+        return module
+
+
+    def _get_code(self, applet_file):
+
+        mtime = int(os.path.getmtime(applet_file))
+
+        code = read_bytecode(applet_file + 'c', mtime)
+        if code is not None:
+            return code
+
+        cache_file = os.path.join(self.cache_dir, '{0}.pyc'.format(hashlib.sha1(applet_file).hexdigest()))
+        code = read_bytecode(cache_file, mtime)
+        if code is not None:
+            return code
+
+        with open(applet_file, 'rU') as f:
+            source = f.read()
+        code = compile(source + '\n', applet_file, 'exec')
+        write_bytecode(cache_file, code, mtime)
+
+        return code
+
+
+    def _find_applet(self, module):
+        """
+        Return the applet class defined in `module`: the one marked with
+        `simplepanel.applet.register` or, failing that, the only one.
+        """
+
+        # `register` doesn't return the class, so registered classes are not
+        # found in the module's namespace.
+        candidates = [cls for cls in simplepanel.applet.APPLETS.itervalues()
+                      if cls.__module__ == module.__name__]
+        if not candidates:
+            candidates = [obj for obj in module.__dict__.itervalues()
+                          if inspect.isclass(obj) and obj.__module__ == module.__name__
+                          and issubclass(obj, simplepanel.applet.Applet)]
+
+        if not candidates:
+            return None
+        elif len(candidates) > 1:
+            raise ImportError("{0} defines more than one applet class: {1}".format(
+                module.__file__, ', '.join(sorted(cls.__name__ for cls in candidates))))
+
+        return candidates[0]
+
+
+_loader = None
+
+
+def get_loader():
+
+    global _loader
+    if _loader is None:
+        _loader = AppletLoader()
+    return _loader
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import json
+
+import cream.manifest
+
+from simplepanel.util import get_cache_dir, write_atomically
+
+INDEX_FILE = os.path.join(get_cache_dir('manifests'), 'index.json')
+INDEX_VERSION = 1
+
+FIELDS = ('id', 'path', 'name', 'description', 'categories', 'icon')
+MANIFEST_FILE = 'manifest.xml'
+
+
+def get_mtime(path):
+
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ManifestIndex(object):
+    """
+    Maps applet ids to the parts of their manifests the panel needs.
+
+    Parsing all manifests with `cream.manifest.ManifestDB` is only necessary
+    if an applet was installed, removed or updated, i.e. one of the applet
+    directories or manifests changed. Otherwise the index is read from the
+    user's cache.
+    """
+
+    def __init__(self, directories, type, filename=INDEX_FILE):
+
+        self.directories = list(directories)
+        self.type = type
+        self.filename = filename
+
+        key = self.get_key()
+        self.manifests = self._load(key)
+        if self.manifests is None:
+            self.manifests = self._scan()
+            self._save(key)
+
+
+    def get(self, applet_id):
+        """ Return the manifest of the applet with the given id, or `None`. """
+
+        return self.manifests.get(applet_id)
+
+
+    def get_all(self):
+        return self.manifests.values()
+
+
+    def get_key(self):
+        """
+        The modification times of the applet directories, of every applet's
+        directory and of its manifest the index is valid for.
+        """
+
+        key = []
+        for directory in self.directories:
+            key.append([directory, get_mtime(directory)])
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.isdir(path):
+                    key.append([path, get_mtime(path), get_mtime(os.path.join(path, MANIFEST_FILE))])
+        return key
+
+
+    def _load(self, key):
+
+        try:
+            with open(self.filename) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if index.get('version') != INDEX_VERSION or index.get('type') != self.type \
+            or index.get('key') != key:
+            return None
+
+        return index['manifests']
+
+
+    def _scan(self):
+
+        db = cream.manifest.ManifestDB(self.directories, self.type)
+
+        manifests = {}
+        for manifest in db.get():
+            manifests[manifest['id']] = dict((field, manifest[field]) for field in FIELDS if field in manifest)
+        return manifests
+
+
+    def _save(self, key):
+
+        try:
+            data = json.dumps({
+                'version': INDEX_VERSION,
+                'type': self.type,
+                'key': key,
+                'manifests': self.manifests
+                })
+        except (TypeError, ValueError):
+            return
+
+        def write(path):
+            with open(path, 'w') as f:
+                f.write(data)
+
+        write_atomically(self.filename, write)
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import gobject
+
+from collections import defaultdict
+
+WINDOW_SIGNALS = ['state-changed', 'geometry-changed', 'workspace-changed']
+
+
+class MaximizedWindowIndex(gobject.GObject):
+    """
+    Keeps track of the maximized windows on every workspace.
+
+    The index is updated from wnck signals only, so asking whether the
+    active workspace contains a maximized window is a dictionary lookup and
+    an idle desktop causes no wakeups at all. `changed` is emitted whenever
+    the answer for the active workspace may have changed.
+    """
+
+    __gtype_name__ = 'MaximizedWindowIndex'
+    __gsignals__ = {
+        'changed': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_BOOLEAN,))
+        }
+
+    def __init__(self, screen):
+
+        gobject.GObject.__init__(self)
+
+        self.screen = screen
+
+        self._maximized = defaultdict(set)
+        self._workspaces = {}
+        self._handlers = {}
+
+        self.screen.connect('window-opened', self.window_opened_cb)
+        self.screen.connect('window-closed', self.window_closed_cb)
+        self.screen.connect('active-workspace-changed', lambda *args: self._emit_changed())
+        self.screen.connect('viewports-changed', lambda *args: self.rebuild())
+
+        for window in self.screen.get_windows():
+            self._add_window(window)
+
+
+    def has_maximized(self, workspace=None):
+        """ Check whether `workspace` (the active one by default) has a maximized window. """
+
+        if workspace is None:
+            workspace = self.screen.get_active_workspace()
+
+        return bool(self._maximized.get(workspace))
+
+
+    def rebuild(self):
+
+        self._maximized.clear()
+        self._workspaces.clear()
+
+        for window in self._handlers:
+            self._update_window(window)
+
+        self._emit_changed()
+
+
+    def window_opened_cb(self, screen, window):
+
+        if window not in self._handlers:
+            self._add_window(window)
+            self._emit_changed()
+
+
+    def window_closed_cb(self, screen, window):
+
+        for handler in self._handlers.pop(window, []):
+            window.disconnect(handler)
+
+        for workspace in self._workspaces.pop(window, ()):
+            self._maximized[workspace].discard(window)
+
+        self._emit_changed()
+
+
+    def window_changed_cb(self, window, *args):
+
+        if self._update_window(window):
+            self._emit_changed()
+
+
+    def _add_window(self, window):
+
+        self._handlers[window] = [window.connect(signal, self.window_changed_cb) for signal in WINDOW_SIGNALS]
+        self._update_window(window)
+
+
+    def _update_window(self, window):
+        """ Recompute the workspaces `window` is maximized on and return whether they changed. """
+
+        if window.is_maximized():
+            workspaces = frozenset(w for w in self.screen.get_workspaces() if window.is_in_viewport(w))
+        else:
+            workspaces = frozenset()
+
+        old = self._workspaces.get(window, frozenset())
+        if old == workspaces:
+            return False
+
+        for workspace in old - workspaces:
+            self._maximized[workspace].discard(window)
+        for workspace in workspaces - old:
+            self._maximized[workspace].add(window)
+
+        self._workspaces[window] = workspaces
+
+        return True
+
+
+    def _emit_changed(self):
+        self.emit('changed', self.has_maximized())
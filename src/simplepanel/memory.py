@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+"""
+Memory accounting.
+
+Pixel data is attributed by walking the attributes of its owners (the
+applets, the panel's caches) and adding up the ImageSurfaces, GdkPixbufs and
+shared buffers found. The Python heap is attributed by the module defining
+each object's type (or function), which catches leaked closures like signal
+handlers connected over and over again. Python 2 has no `tracemalloc`, so
+the heap figures are the shallow sizes of the objects tracked by the garbage
+collector.
+"""
+
+import gc
+import sys
+import mmap
+import time
+import types
+
+from collections import deque
+
+import gtk
+import cairo
+
+MAX_DEPTH = 8
+APPLET_MODULE_PREFIX = 'applet_'
+
+ATOMIC_TYPES = (basestring, int, long, float, bool, types.NoneType, type, types.ClassType,
+                types.ModuleType, types.FunctionType, types.MethodType,
+                types.BuiltinFunctionType, types.CodeType, types.FrameType)
+CONTAINER_TYPES = (list, tuple, set, frozenset, deque)
+
+
+def get_buffer_size(obj):
+    """ Return the category and number of bytes of pixel data held by `obj`, or `None`. """
+
+    if isinstance(obj, cairo.ImageSurface):
+        return 'surfaces', obj.get_stride() * obj.get_height()
+    elif isinstance(obj, gtk.gdk.Pixbuf):
+        return 'pixbufs', obj.get_rowstride() * obj.get_height()
+    elif isinstance(obj, mmap.mmap):
+        return 'shared-buffers', len(obj)
+    return None
+
+
+def iter_buffers(root, seen, max_depth=MAX_DEPTH):
+    """ Find the pixel buffers reachable from `root` not in `seen` yet. """
+
+    stack = [(root, 0)]
+    while stack:
+        obj, depth = stack.pop()
+        if isinstance(obj, ATOMIC_TYPES) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        size = get_buffer_size(obj)
+        if size is not None:
+            yield size
+            continue
+
+        if depth >= max_depth:
+            continue
+
+        if isinstance(obj, dict):
+            children = obj.keys() + obj.values()
+        elif isinstance(obj, CONTAINER_TYPES):
+            children = obj
+        else:
+            children = list(getattr(obj, '__dict__', {}).itervalues())
+            for name in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, name):
+                    children.append(getattr(obj, name))
+
+        stack.extend((child, depth + 1) for child in children)
+
+
+def get_module_root(obj):
+
+    if isinstance(obj, types.FunctionType):
+        module = obj.__module__
+    else:
+        module = type(obj).__module__
+    return (module or '').split('.')[0]
+
+
+class MemorySnapshot(object):
+    """ Bytes and number of objects per `(owner, category)` at one point in time. """
+
+    def __init__(self, entries, timestamp=None):
+
+        self.entries = entries
+        self.time = timestamp if timestamp is not None else time.time()
+
+
+    def get_totals(self):
+        """ Return `{owner: bytes}`. """
+
+        totals = {}
+        for (owner, category), (count, size) in self.entries.iteritems():
+            totals[owner] = totals.get(owner, 0) + size
+        return totals
+
+
+    def diff(self, other):
+        """
+        Return the changes since the older snapshot `other` as a list of
+        `(owner, category, objects, bytes)`, biggest growth first.
+        """
+
+        changes = []
+        for key in set(self.entries) | set(other.entries):
+            count, size = self.entries.get(key, (0, 0))
+            old_count, old_size = other.entries.get(key, (0, 0))
+            if count != old_count or size != old_size:
+                changes.append(key + (count - old_count, size - old_size))
+        changes.sort(key=lambda change: change[3], reverse=True)
+        return changes
+
+
+    def format(self, other=None):
+
+        lines = ['{0:<40} {1:<16} {2:>8} {3:>12}'.format('owner', 'category', 'objects', 'bytes')]
+        for (owner, category), (count, size) in sorted(self.entries.iteritems()):
+            lines.append('{0:<40} {1:<16} {2:>8} {3:>12}'.format(owner, category, count, size))
+
+        if other is not None:
+            lines.append('Changes during the last {0:.0f} s:'.format(self.time - other.time))
+            for owner, category, count, size in self.diff(other):
+                lines.append('{0:<40} {1:<16} {2:>+8} {3:>+12}'.format(owner, category, count, size))
+
+        return '\n'.join(lines)
+
+
+class MemoryAccountant(object):
+    """
+    Takes `MemorySnapshot`s. Owners are the applets, given as
+    `(applet_id, applet)` pairs, and the objects returned by the functions
+    registered with `add_root`, like the panel's caches.
+    """
+
+    def __init__(self):
+        self.roots = []
+
+
+    def add_root(self, get_objects):
+        """
+        `get_objects` returns `(owner, category, obj)` triples, pixel data
+        reachable from `obj` is accounted to `owner` in `category` (or by its
+        type if `category` is `None`).
+        """
+
+        self.roots.append(get_objects)
+
+
+    def take_snapshot(self, applets):
+
+        entries = {}
+        seen = set([id(entries)])
+
+        def add(owner, category, count, size):
+            old_count, old_size = entries.get((owner, category), (0, 0))
+            entries[(owner, category)] = (old_count + count, old_size + size)
+
+        modules = {}
+        for applet_id, applet in applets:
+            modules[get_module_root(applet)] = applet_id
+            for category, size in iter_buffers(applet, seen):
+                add(applet_id, category, 1, size)
+
+        for get_objects in self.roots:
+            for owner, category, obj in get_objects():
+                for buffer_category, size in iter_buffers(obj, seen):
+                    add(owner, category or buffer_category, 1, size)
+
+        for obj in gc.get_objects():
+            module = get_module_root(obj)
+            if module.startswith(APPLET_MODULE_PREFIX):
+                add(modules.get(module, module), 'python', 1, sys.getsizeof(obj, 0))
+
+        return MemorySnapshot(entries)
@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import time
+
+from collections import deque
+
+import gobject
+import gtk
+
+FLASH_DURATION = .4
+FLASH_COLOR = (1, 0, 0)
+REFRESH_INTERVAL = 50
+FRAME_SAMPLES = 240
+HUD_SIZE = (170, 14)
+STATUS_WIDTH = 360
+STATUS_DURATION = 10
+FONT_SIZE = 9
+
+
+class DebugOverlay(object):
+    """
+    Paints debugging information on top of the panel: every invalidated
+    rectangle flashes for a moment, a box in the middle of the panel shows
+    the frame rate and the duration of the last expose, and `get_labels`,
+    if set, provides `(rectangle, text)` pairs to put next to the applets.
+
+    A `status` line set with `set_status` is shown below that box for a few
+    seconds, even if the overlay itself is disabled.
+    """
+
+    def __init__(self, widget):
+
+        self.widget = widget
+        self.enabled = False
+        self.get_labels = None
+        self.status = None
+
+        self.flashes = deque()
+        self.frames = deque(maxlen=FRAME_SAMPLES)
+        self.expose_time = 0
+
+        self._expose_start = None
+        self._source = None
+        self._status_source = None
+
+
+    def set_enabled(self, enabled):
+
+        if enabled == self.enabled:
+            return
+
+        self.enabled = enabled
+        self.flashes.clear()
+        self.frames.clear()
+
+        if enabled:
+            self._source = gobject.timeout_add(REFRESH_INTERVAL, self._refresh)
+        elif self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+
+        self.widget.queue_draw()
+
+
+    def set_status(self, status, duration=STATUS_DURATION):
+        """ Show `status` for `duration` seconds, `None` hides the status line. """
+
+        if self._status_source is not None:
+            gobject.source_remove(self._status_source)
+            self._status_source = None
+
+        self.status = status
+        if status is not None:
+            self._status_source = gobject.timeout_add_seconds(duration, self._clear_status)
+
+        status = self.get_status_rectangle()
+        self.widget.queue_draw_area(status.x, status.y, status.width, status.height)
+
+
+    def is_visible(self):
+        return self.enabled or self.status is not None
+
+
+    def add_damage(self, rectangles):
+
+        now = time.time()
+        for rectangle in rectangles:
+            self.flashes.append((now, rectangle))
+
+
+    def add_frame(self):
+        self.frames.append(time.time())
+
+
+    def get_fps(self):
+
+        now = time.time()
+        return sum(1 for t in self.frames if now - t <= 1)
+
+
+    def expose_started(self):
+        self._expose_start = time.time()
+
+
+    def expose_finished(self):
+
+        if self._expose_start is not None:
+            self.expose_time = time.time() - self._expose_start
+            self._expose_start = None
+
+
+    def get_hud_rectangle(self):
+
+        width = self.widget.get_size()[0]
+        return gtk.gdk.Rectangle((width - HUD_SIZE[0]) // 2, 0, HUD_SIZE[0], HUD_SIZE[1])
+
+
+    def get_status_rectangle(self):
+
+        width = self.widget.get_size()[0]
+        return gtk.gdk.Rectangle((width - STATUS_WIDTH) // 2, HUD_SIZE[1], STATUS_WIDTH, HUD_SIZE[1])
+
+
+    def paint(self, ctx):
+
+        ctx.select_font_face('monospace')
+        ctx.set_font_size(FONT_SIZE)
+
+        if self.enabled:
+            self._paint_debug(ctx)
+
+        if self.status is not None:
+            status = self.get_status_rectangle()
+            self._paint_text(ctx, status.x, status.y, self.status)
+
+
+    def _paint_debug(self, ctx):
+
+        now = time.time()
+
+        for start, rectangle in self.flashes:
+            alpha = .5 * (1 - (now - start) / FLASH_DURATION)
+            if alpha <= 0:
+                continue
+            ctx.set_source_rgba(FLASH_COLOR[0], FLASH_COLOR[1], FLASH_COLOR[2], alpha)
+            ctx.rectangle(rectangle.x, rectangle.y, rectangle.width, rectangle.height)
+            ctx.fill()
+
+        if self.get_labels is not None:
+            for rectangle, text in self.get_labels():
+                self._paint_text(ctx, rectangle.x, rectangle.y + rectangle.height - FONT_SIZE - 2, text)
+
+        hud = self.get_hud_rectangle()
+        text = '{0:3d} fps {1:6.2f} ms'.format(self.get_fps(), self.expose_time * 1000)
+        self._paint_text(ctx, hud.x, hud.y, text)
+
+
+    def _paint_text(self, ctx, x, y, text):
+
+        extents = ctx.text_extents(text)
+
+        ctx.set_source_rgba(0, 0, 0, .7)
+        ctx.rectangle(x, y, extents[4] + 4, FONT_SIZE + 2)
+        ctx.fill()
+
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.move_to(x + 2, y + FONT_SIZE)
+        ctx.show_text(text)
+
+
+    def _clear_status(self):
+
+        self._status_source = None
+        self.set_status(None)
+        return False
+
+
+    def _refresh(self):
+
+        window = self.widget.window
+        if window is None:
+            return True
+
+        # Repaint fading flashes (and those which just disappeared) and the
+        # frame rate directly, without flashing them again.
+        now = time.time()
+        damage = gtk.gdk.region_rectangle(self.get_hud_rectangle())
+        for start, rectangle in self.flashes:
+            damage.union_with_rect(rectangle)
+        while self.flashes and now - self.flashes[0][0] > FLASH_DURATION:
+            self.flashes.popleft()
+
+        window.invalidate_region(damage, True)
+
+        return True
@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import json
+import time
+import logging
+import threading
+
+from collections import deque
+
+import gobject
+
+from simplepanel.layout import PanelLayout
+from simplepanel.executor import get_executor
+from simplepanel.util import write_atomically
+
+SAVE_DELAY = 500
+HISTORY_SIZE = 32
+
+RESULTS = ('written', 'unchanged', 'failed')
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutStore(object):
+    """
+    Persists the panel layout to a JSON file.
+
+    The file is the only place the layout is kept. Older versions stored it
+    in the `layout` configuration field, which is now only read once: when
+    there is no file yet, `load` migrates the layout from there (or starts
+    out with the default layout of the configuration scheme).
+
+    Saving is debounced: the layout is only written `delay` milliseconds
+    after the last call to `save`. The layout is turned into plain lists and
+    dictionaries on the main loop; serializing and writing happen on the
+    shared executor. The file is replaced atomically and not touched at all
+    if its content would not change. `history` holds `(time, duration,
+    result)` for the most recent saves, `result` being one of `RESULTS`.
+    `flush` writes a pending layout right away, the panel calls it when
+    shutting down.
+    """
+
+    def __init__(self, filename, delay=SAVE_DELAY):
+
+        self.filename = filename
+        self.delay = delay
+
+        self.counters = dict((result, 0) for result in RESULTS)
+        self.history = deque(maxlen=HISTORY_SIZE)
+
+        # The content of the file and the generation of the layout it
+        # holds, only touched while holding the lock once loaded.
+        self._lock = threading.Lock()
+        self._data = None
+        self._written = 0
+        self._generation = 0
+        self._pending = None
+        self._source = None
+        self._task = None
+
+
+    def load(self, legacy):
+        """
+        Load the layout. Without a valid file it is built from the list
+        `legacy`, the layout stored in the configuration, and written to the
+        file.
+        """
+
+        try:
+            with open(self.filename) as f:
+                data = f.read()
+            layout = PanelLayout.from_list(json.loads(data))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            logger.info("Migrating the panel layout from the configuration to %s", self.filename)
+            layout = PanelLayout.from_list(legacy)
+            self.save(layout)
+            return layout
+
+        self._data = data
+        return layout
+
+
+    def save(self, layout):
+
+        self._pending = layout.to_list()
+        self._generation += 1
+
+        if self._source is not None:
+            gobject.source_remove(self._source)
+        self._source = gobject.timeout_add(self.delay, self._flush)
+
+
+    def flush(self):
+        """ Write the pending layout, if any, before returning. """
+
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+
+        if self._pending is not None:
+            layout, self._pending = self._pending, None
+            self._written_cb(self._write(layout, self._generation))
+
+
+    def get_stats(self):
+
+        durations = [duration for timestamp, duration, result in self.history]
+        stats = dict(self.counters)
+        stats['last_duration'] = durations[-1] if durations else None
+        stats['mean_duration'] = sum(durations) / len(durations) if durations else None
+        return stats
+
+
+    def _flush(self):
+
+        # Writes must not overlap, try again once the current one finished.
+        if self._task is not None and not self._task.done:
+            return True
+
+        self._source = None
+
+        layout, self._pending = self._pending, None
+        generation = self._generation
+        self._task = get_executor().submit(lambda: self._write(layout, generation), self._written_cb)
+
+        return False
+
+
+    def _write(self, layout, generation):
+
+        start = time.time()
+
+        data = json.dumps(layout, indent=4, sort_keys=True)
+
+        def write(path):
+            with open(path, 'w') as f:
+                f.write(data)
+
+        # A worker still writing an older layout when `flush` is called
+        # must not overwrite the newer one.
+        with self._lock:
+            if generation < self._written or data == self._data:
+                self._written = max(self._written, generation)
+                return (start, time.time() - start, 'unchanged')
+
+            if not write_atomically(self.filename, write):
+                return (start, time.time() - start, 'failed')
+
+            self._data = data
+            self._written = generation
+
+        return (start, time.time() - start, 'written')
+
+
+    def _written_cb(self, result):
+
+        self.history.append(result)
+        self.counters[result[2]] += 1
@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+"""
+The parts of the panel's layout and render path which don't depend on GTK,
+so the benchmarks exercise the same code as the panel.
+
+Rectangles are `(x, y, width, height)` tuples of integers.
+"""
+
+import math
+import time
+import cairo
+
+
+def surface_size(allocation):
+    """ Convert an applet allocation into integral surface dimensions. """
+
+    width, height = allocation
+    return int(math.ceil(width)), int(math.ceil(height))
+
+
+def get_rectangle(applet):
+    """ Return the smallest integral rectangle covering the given applet. """
+
+    x, y = applet.get_position()
+    width, height = applet.get_allocation()
+
+    x0, y0 = int(math.floor(x)), int(math.floor(y))
+    x1, y1 = int(math.ceil(x + width)), int(math.ceil(y + height))
+
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def relayout(layout, width, rectangles, groups=None):
+    """
+    Lay out the given groups of `layout` (all groups by default) for a panel
+    `width` wide. `rectangles` maps every applet to the rectangle it was
+    last painted at and is updated; the rectangles that need repainting
+    because applets moved or changed their size are returned.
+    """
+
+    damage = []
+
+    for group_n, group in enumerate(layout):
+        if groups is not None and group_n not in groups:
+            continue
+
+        group.layout(width)
+
+        for slot in group.applets:
+            applet = slot.instance
+            old = rectangles.get(applet)
+            new = get_rectangle(applet)
+            if old != new:
+                if old is not None:
+                    damage.append(old)
+                damage.append(new)
+                rectangles[applet] = new
+
+    return damage
+
+
+def composite(ctx, applets, get_surface, visible=None):
+    """
+    Paint the surfaces returned by `get_surface` for `applets` at their
+    positions. Applets whose rectangle `visible` returns false for are
+    skipped.
+    """
+
+    for applet in applets:
+        if visible is not None and not visible(get_rectangle(applet)):
+            continue
+
+        surface = get_surface(applet)
+        x, y = applet.get_position()
+
+        ctx.set_source_surface(surface, x, y)
+        ctx.rectangle(x, y, surface.get_width(), surface.get_height())
+        ctx.fill()
+
+
+class SurfaceCache(object):
+    """
+    Retained-mode backing store for applets.
+
+    Every applet gets its own offscreen surface which is only regenerated
+    after the applet asked for it by emitting `render-request` (or when its
+    allocation changed). All other exposes just blit the cached surface.
+    The time spent rendering is recorded in `stats`, if given.
+    """
+
+    def __init__(self, stats=None):
+
+        self.stats = stats
+
+        self._surfaces = {}
+        self._dirty = set()
+        self._rendered = set()
+
+
+    def invalidate(self, applet):
+        self._dirty.add(applet)
+
+
+    def discard(self, applet):
+
+        self._surfaces.pop(applet, None)
+        self._dirty.discard(applet)
+        self._rendered.discard(applet)
+
+
+    def clear(self):
+
+        self._surfaces.clear()
+        self._dirty.clear()
+        self._rendered.clear()
+
+
+    def peek(self, applet):
+        """ Return the cached surface of `applet` without rendering it. """
+
+        return self._surfaces.get(applet)
+
+
+    def pop_rendered(self):
+        """ Return the applets rendered since the last call. """
+
+        rendered = self._rendered
+        self._rendered = set()
+        return rendered
+
+
+    def get_surface(self, applet):
+
+        # Applets hosted out of process already hand out a finished surface.
+        if getattr(applet, 'provides_surface', False):
+            return applet.get_surface()
+
+        width, height = surface_size(applet.get_allocation())
+        surface = self._surfaces.get(applet)
+
+        if surface is None or applet in self._dirty \
+            or surface.get_width() != width or surface.get_height() != height:
+            surface = self._render(applet, width, height)
+            self._surfaces[applet] = surface
+            self._dirty.discard(applet)
+            self._rendered.add(applet)
+
+        return surface
+
+
+    def create_context(self, surface):
+        return cairo.Context(surface)
+
+
+    def _render(self, applet, width, height):
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        ctx = self.create_context(surface)
+
+        ctx.rectangle(0, 0, width, height)
+        ctx.clip()
+
+        start = time.time()
+        applet.render(ctx)
+        if self.stats is not None:
+            self.stats.record(applet, 'render', start)
+
+        return surface
@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import time
+import gobject
+
+from simplepanel.scheduler import DEFAULT_MAX_FPS
+
+
+class PointerTracker(object):
+    """
+    Dispatches pointer motion to the applets.
+
+    Raw motion events are compressed, only the latest position is dispatched
+    and at most once per frame. The tracker also remembers the applet under
+    the pointer and emits `mouse-leave` and `mouse-enter` on the applets when
+    the pointer crosses from one applet to another.
+    """
+
+    def __init__(self, get_applet_at_coords, max_fps=DEFAULT_MAX_FPS, stats=None):
+
+        self.get_applet_at_coords = get_applet_at_coords
+        self.max_fps = max(1, max_fps)
+        self.stats = stats
+
+        self.hovered = None
+
+        self.events = 0
+        self.dispatches = 0
+
+        self._pending = None
+        self._source = None
+        self._last_dispatch = 0
+
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max(1, max_fps)
+
+
+    def motion(self, x, y):
+
+        self.events += 1
+        self._pending = (x, y)
+
+        if self._source is not None:
+            return
+
+        delay = self._last_dispatch + 1.0 / self.max_fps - time.time()
+        if delay > 0:
+            self._source = gobject.timeout_add(int(delay * 1000) + 1, self._dispatch_pending)
+        else:
+            self._source = gobject.idle_add(self._dispatch_pending, priority=gobject.PRIORITY_HIGH_IDLE)
+
+
+    def enter(self, x, y):
+
+        self.events += 1
+        self._cancel()
+        self._dispatch(x, y, motion=False)
+
+
+    def leave(self, x, y):
+
+        self.events += 1
+        self._cancel()
+        self._set_hovered(None, x, y)
+
+
+    def reset(self):
+        """ Forget the hovered applet, e.g. because it has been removed. """
+
+        self._cancel()
+        self.hovered = None
+
+
+    def _cancel(self):
+
+        if self._source is not None:
+            gobject.source_remove(self._source)
+            self._source = None
+        self._pending = None
+
+
+    def _dispatch_pending(self):
+
+        x, y = self._pending
+
+        self._source = None
+        self._pending = None
+
+        self._dispatch(x, y)
+
+        return False
+
+
+    def _dispatch(self, x, y, motion=True):
+
+        self.dispatches += 1
+        self._last_dispatch = time.time()
+
+        applet = self.get_applet_at_coords(x, y)
+        self._set_hovered(applet, x, y)
+
+        if applet is not None and motion:
+            offset_x, offset_y = applet.get_position()
+            start = time.time()
+            applet.emit('mouse-motion', x - offset_x, y - offset_y)
+            if self.stats is not None:
+                self.stats.record(applet, 'mouse-motion', start)
+
+
+    def _set_hovered(self, applet, x, y):
+
+        if applet is self.hovered:
+            return
+
+        if self.hovered is not None:
+            offset_x, offset_y = self.hovered.get_position()
+            self.hovered.emit('mouse-leave', x - offset_x, y - offset_y)
+
+        self.hovered = applet
+
+        if applet is not None:
+            offset_x, offset_y = applet.get_position()
+            applet.emit('mouse-enter', x - offset_x, y - offset_y)
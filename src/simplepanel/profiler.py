@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+"""
+Startup profiling.
+
+Profiling is enabled by setting `SIMPLEPANEL_PROFILE` to the name of the file
+to write, or by passing `--profile-startup=FILE`. Every phase of the startup
+is recorded with its wall and CPU time. Once the panel is up, the phases are
+written as a Chrome trace (load it in chrome://tracing) and summarized on
+stdout; `get_status` condenses the summary into a line for the debug overlay.
+"""
+
+import os
+import json
+import time
+import thread
+
+from collections import OrderedDict
+
+PROFILE_ENV = 'SIMPLEPANEL_PROFILE'
+PROFILE_OPTION = '--profile-startup'
+DEFAULT_FILENAME = 'simple-panel-startup.json'
+
+_profiler = None
+
+
+def get_cpu_time():
+    """ The processor time used by the process, `os.times` is too coarse. """
+
+    return time.clock()
+
+
+class Phase(object):
+
+    def __init__(self, profiler, name, category, args):
+
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+
+
+    def __enter__(self):
+
+        self.start = time.time()
+        self.cpu_start = get_cpu_time()
+        return self
+
+
+    def __exit__(self, type, value, traceback):
+
+        self.profiler.add(self.name, self.category, self.start,
+                          time.time() - self.start,
+                          get_cpu_time() - self.cpu_start,
+                          self.args)
+
+
+class NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+NULL_PHASE = NullPhase()
+
+
+class StartupProfiler(object):
+    """ Records the startup phases of the panel, if `filename` is set. """
+
+    def __init__(self, filename=None):
+
+        self.filename = filename
+        self.enabled = filename is not None
+        self.events = []
+
+        self.start = time.time()
+        self.cpu_start = get_cpu_time()
+
+
+    def phase(self, name, category='startup', **args):
+        """ Return a context manager recording the time spent within it. """
+
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name, category, args)
+
+
+    def add(self, name, category, start, wall, cpu, args=None):
+
+        if self.enabled:
+            self.events.append((name, category, start, wall, cpu, thread.get_ident(), args or {}))
+
+
+    def get_trace(self):
+        """ Return the recorded phases in the Chrome trace event format. """
+
+        pid = os.getpid()
+        events = []
+
+        for name, category, start, wall, cpu, tid, args in self.events:
+            args = dict(args, cpu_ms=round(cpu * 1000, 3))
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int((start - self.start) * 1000000),
+                'dur': int(wall * 1000000),
+                'pid': pid,
+                'tid': tid,
+                'args': args
+                })
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+    def get_summary(self):
+        """ Return the total wall and CPU time and the number of calls per phase. """
+
+        summary = OrderedDict()
+        for name, category, start, wall, cpu, tid, args in self.events:
+            count, total_wall, total_cpu = summary.get(name, (0, 0, 0))
+            summary[name] = (count + 1, total_wall + wall, total_cpu + cpu)
+        return summary
+
+
+    def get_slowest(self, count=5):
+        """ Return the `count` longest phases recorded for applets. """
+
+        return sorted((event for event in self.events if 'applet' in event[6]),
+                      key=lambda event: event[3], reverse=True)[:count]
+
+
+    def get_status(self):
+        """ Return the startup time and the slowest applet phase in one line, or `None`. """
+
+        summary = self.get_summary()
+        if 'startup' not in summary:
+            return None
+
+        status = 'startup {0:.0f} ms'.format(summary['startup'][1] * 1000)
+        for name, category, start, wall, cpu, tid, args in self.get_slowest(1):
+            status += ', slowest {0} {1} {2:.0f} ms'.format(args['applet'].split('.')[-1], name, wall * 1000)
+        return status
+
+
+    def finish(self):
+        """ Stop recording, write the trace and print a summary. """
+
+        if not self.enabled:
+            return
+
+        self.add('startup', 'startup', self.start, time.time() - self.start, get_cpu_time() - self.cpu_start)
+        self.enabled = False
+
+        try:
+            with open(self.filename, 'w') as f:
+                json.dump(self.get_trace(), f)
+        except (IOError, OSError), e:
+            print "Could not write startup trace to '{0}': {1}".format(self.filename, e)
+
+        print "Startup profile (trace written to '{0}'):".format(self.filename)
+        print "  {0:<36} {1:>6} {2:>10} {3:>10}".format('phase', 'calls', 'wall [ms]', 'cpu [ms]')
+        for name, (count, wall, cpu) in self.get_summary().iteritems():
+            print "  {0:<36} {1:>6} {2:>10.1f} {3:>10.1f}".format(name, count, wall * 1000, cpu * 1000)
+
+        slowest = self.get_slowest()
+        if slowest:
+            print "  Slowest applet phases:"
+            for name, category, start, wall, cpu, tid, args in slowest:
+                print "  {0:<36} {1:<10} {2:>10.1f} {3:>10.1f}".format(args['applet'], name, wall * 1000, cpu * 1000)
+
+
+def configure(args):
+    """
+    Set up the profiler from the environment and the command line `args`.
+    The profiling option is removed from `args`.
+    """
+
+    global _profiler
+
+    filename = os.environ.get(PROFILE_ENV) or None
+    for arg in list(args):
+        if arg == PROFILE_OPTION or arg.startswith(PROFILE_OPTION + '='):
+            filename = arg.partition('=')[2] or DEFAULT_FILENAME
+            args.remove(arg)
+
+    _profiler = StartupProfiler(filename)
+    return _profiler
+
+
+def get_profiler():
+
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler(os.environ.get(PROFILE_ENV) or None)
+    return _profiler
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import time
+import gobject
+
+DEFAULT_MAX_FPS = 60
+
+
+class FrameScheduler(gobject.GObject):
+    """
+    Coalesces render and relayout requests into frames.
+
+    Requests are collected until the next main loop iteration (or until the
+    frame budget given by `max_fps` allows the next frame) and are then
+    handed out at once through the `frame` signal. The signal carries the
+    set of layout groups which need a relayout (`None` standing for all of
+    them), a boolean telling whether a redraw of the whole panel was
+    requested and the list of applets which asked to be rendered.
+    """
+
+    __gtype_name__ = 'FrameScheduler'
+    __gsignals__ = {
+        'frame': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE, (gobject.TYPE_PYOBJECT, gobject.TYPE_BOOLEAN, gobject.TYPE_PYOBJECT))
+        }
+
+    def __init__(self, max_fps=DEFAULT_MAX_FPS):
+
+        gobject.GObject.__init__(self)
+
+        self.max_fps = max(1, max_fps)
+
+        self.requests = 0
+        self.requests_merged = 0
+        self.frames = 0
+
+        self._relayout = set()
+        self._redraw = False
+        self._applets = []
+        self._source = None
+        self._last_frame = 0
+
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max(1, max_fps)
+
+
+    def request_render(self, applet):
+
+        self.requests += 1
+
+        if applet in self._applets or None in self._relayout or self._redraw:
+            self.requests_merged += 1
+            return
+        self._applets.append(applet)
+        self._schedule()
+
+
+    def request_relayout(self, group=None):
+        """ Request a relayout of `group`, or of all groups if it is `None`. """
+
+        self.requests += 1
+
+        if group in self._relayout or None in self._relayout:
+            self.requests_merged += 1
+            return
+        self._relayout.add(group)
+        self._schedule()
+
+
+    def request_redraw(self):
+
+        self.requests += 1
+
+        if self._redraw:
+            self.requests_merged += 1
+            return
+        self._redraw = True
+        self._schedule()
+
+
+    def get_stats(self):
+
+        return {
+            'requests': self.requests,
+            'requests_merged': self.requests_merged,
+            'frames': self.frames
+            }
+
+
+    def _schedule(self):
+
+        if self._source is not None:
+            self.requests_merged += 1
+            return
+
+        delay = self._last_frame + 1.0 / self.max_fps - time.time()
+        if delay > 0:
+            self._source = gobject.timeout_add(int(delay * 1000) + 1, self._dispatch)
+        else:
+            self._source = gobject.idle_add(self._dispatch, priority=gobject.PRIORITY_HIGH_IDLE)
+
+
+    def _dispatch(self):
+
+        relayout, redraw, applets = self._relayout, self._redraw, self._applets
+
+        self._source = None
+        self._relayout = set()
+        self._redraw = False
+        self._applets = []
+        self._last_frame = time.time()
+        self.frames += 1
+
+        self.emit('frame', relayout, redraw, applets)
+
+        return False
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import json
+import mmap
+import hashlib
+
+import gobject
+import cairo
+
+import simplepanel.applet
+from simplepanel.util import get_cache_dir, load_png, save_png, write_atomically
+
+SNAPSHOT_DIR = get_cache_dir('snapshots')
+FRAME_DIR = get_cache_dir('frame')
+
+
+def get_digest(surface, key):
+    """ Hash the pixels of `surface` together with the JSON serializable `key`. """
+
+    surface.flush()
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True))
+    digest.update(surface.get_data())
+    return digest.hexdigest()
+
+
+class Snapshot(object):
+    """ The last rendering of an applet together with its allocation. """
+
+    __slots__ = ('surface', 'allocation')
+
+    def __init__(self, surface, allocation):
+
+        self.surface = surface
+        self.allocation = allocation
+
+
+class SnapshotStore(object):
+    """
+    Persists applet snapshots as a PNG and a JSON file per applet id.
+    Snapshots identical to the one on disk are not written again.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR):
+
+        self.directory = directory
+        self._digests = {}
+
+
+    def load(self, applet_id):
+
+        try:
+            with open(self._get_filename(applet_id, 'json')) as f:
+                allocation = tuple(json.load(f)['allocation'])
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        surface = load_png(self._get_filename(applet_id, 'png'))
+        if surface is None:
+            return None
+
+        self._digests[applet_id] = get_digest(surface, list(allocation))
+        return Snapshot(surface, allocation)
+
+
+    def save(self, applet_id, surface, allocation):
+
+        digest = get_digest(surface, list(allocation))
+        if self._digests.get(applet_id) == digest:
+            return
+
+        def write_json(path):
+            with open(path, 'w') as f:
+                json.dump({'allocation': list(allocation)}, f)
+
+        if save_png(self._get_filename(applet_id, 'png'), surface):
+            if write_atomically(self._get_filename(applet_id, 'json'), write_json):
+                self._digests[applet_id] = digest
+
+
+    def _get_filename(self, applet_id, extension):
+        return os.path.join(self.directory, '{0}.{1}'.format(applet_id, extension))
+
+
+class FrameStore(object):
+    """
+    Persists the last fully composited panel frame.
+
+    The pixels are stored raw so they can be memory-mapped and handed to
+    cairo directly on load. A JSON file next to them holds the geometry and
+    the key (screen width, theme, layout) the frame was rendered for; a frame
+    is only returned if that key still matches. Saving the frame on disk
+    again does nothing.
+    """
+
+    def __init__(self, directory=FRAME_DIR):
+
+        self.directory = directory
+        self.data_file = os.path.join(directory, 'frame.argb')
+        self.info_file = os.path.join(directory, 'frame.json')
+        self._digest = None
+
+
+    def load(self, key):
+
+        try:
+            with open(self.info_file) as f:
+                info = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if info.get('key') != key:
+            return None
+
+        width, height, stride = info['width'], info['height'], info['stride']
+
+        try:
+            with open(self.data_file, 'rb') as f:
+                # A private mapping, cairo wants a writable buffer.
+                data = mmap.mmap(f.fileno(), stride * height, access=mmap.ACCESS_COPY)
+        except (IOError, OSError, ValueError, mmap.error):
+            return None
+
+        surface = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, width, height, stride)
+        self._digest = get_digest(surface, key)
+        return surface
+
+
+    def save(self, key, surface):
+
+        digest = get_digest(surface, key)
+        if digest == self._digest:
+            return
+
+        def write_data(path):
+            with open(path, 'wb') as f:
+                f.write(surface.get_data())
+
+        def write_info(path):
+            with open(path, 'w') as f:
+                json.dump({
+                    'key': key,
+                    'width': surface.get_width(),
+                    'height': surface.get_height(),
+                    'stride': surface.get_stride()
+                    }, f)
+
+        if write_atomically(self.data_file, write_data):
+            if write_atomically(self.info_file, write_info):
+                self._digest = digest
+
+
+class PlaceholderApplet(gobject.GObject):
+    """
+    Stands in for an applet which has not been activated yet and paints its
+    snapshot, if there is one.
+    """
+
+    __gtype_name__ = 'PlaceholderApplet'
+    __gsignals__ = simplepanel.applet.Applet.__gsignals__
+
+    provides_surface = True
+
+    def __init__(self, snapshot, height):
+
+        gobject.GObject.__init__(self)
+
+        if snapshot is not None:
+            self.surface = snapshot.surface
+            self.allocation = snapshot.allocation
+        else:
+            self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 0, 0)
+            self.allocation = (0, height)
+        self.position = None
+
+
+    def get_surface(self):
+        return self.surface
+
+
+    def show_menu(self):
+        pass
+
+
+    def draw(self):
+        self.emit('render-request')
+
+
+    def render(self, ctx):
+
+        ctx.set_source_surface(self.surface)
+        ctx.paint()
+
+
+    def set_position(self, x, y):
+        self.position = (x, y)
+
+
+    def get_position(self):
+        return self.position
+
+
+    def get_allocation(self):
+        return self.allocation
+
+
+    def allocate(self, height):
+        return self.get_allocation()
+
+
+    def destroy(self):
+        pass
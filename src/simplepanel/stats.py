@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import json
+import time
+
+from array import array
+
+from simplepanel.util import get_cache_dir, write_atomically
+
+STATS_FILE = os.path.join(get_cache_dir(), 'stats.json')
+
+# Bucket `i` holds durations in [2 ** (i - 1), 2 ** i) microseconds, the
+# last one everything above.
+BUCKETS = 24
+WINDOWS = 6
+WINDOW_DURATION = 10
+
+KINDS = ('render', 'allocate', 'click', 'scroll', 'mouse-motion')
+
+
+class LatencyHistogram(object):
+    """
+    A rolling latency histogram.
+
+    The last `WINDOWS * WINDOW_DURATION` seconds are kept in a ring of
+    windows, each a fixed row of logarithmic buckets in one flat array, so
+    recording a duration does not allocate anything.
+    """
+
+    __slots__ = ('buckets', 'totals', 'maxima', 'epochs', 'last')
+
+    def __init__(self):
+
+        self.buckets = array('L', [0] * (WINDOWS * BUCKETS))
+        self.totals = array('d', [0] * WINDOWS)
+        self.maxima = array('d', [0] * WINDOWS)
+        self.epochs = array('l', [-1] * WINDOWS)
+        self.last = 0
+
+
+    def add(self, duration, now):
+
+        epoch = int(now) // WINDOW_DURATION
+        window = epoch % WINDOWS
+
+        if self.epochs[window] != epoch:
+            self._clear(window)
+            self.epochs[window] = epoch
+
+        self.last = duration
+
+        bucket = min(int(duration * 1000000).bit_length(), BUCKETS - 1)
+        self.buckets[window * BUCKETS + bucket] += 1
+        self.totals[window] += duration
+        if duration > self.maxima[window]:
+            self.maxima[window] = duration
+
+
+    def _clear(self, window):
+
+        offset = window * BUCKETS
+        for i in xrange(offset, offset + BUCKETS):
+            self.buckets[i] = 0
+        self.totals[window] = 0
+        self.maxima[window] = 0
+
+
+    def get_summary(self, now=None):
+        """
+        Summarize the windows still within the rolling period. Percentiles
+        are the upper bounds of the buckets they fall into, in seconds.
+        """
+
+        if now is None:
+            now = time.time()
+        epoch = int(now) // WINDOW_DURATION
+
+        counts = [0] * BUCKETS
+        total = maximum = 0
+        for window in xrange(WINDOWS):
+            if self.epochs[window] < 0 or epoch - self.epochs[window] >= WINDOWS:
+                continue
+            offset = window * BUCKETS
+            for i in xrange(BUCKETS):
+                counts[i] += self.buckets[offset + i]
+            total += self.totals[window]
+            maximum = max(maximum, self.maxima[window])
+
+        count = sum(counts)
+        summary = {'count': count, 'total': total, 'max': maximum}
+        summary['mean'] = total / count if count else 0
+        for name, fraction in (('p50', .5), ('p95', .95), ('p99', .99)):
+            summary[name] = self._percentile(counts, count, fraction, maximum)
+
+        return summary
+
+
+    def _percentile(self, counts, count, fraction, maximum):
+
+        if not count:
+            return 0
+
+        seen = 0
+        for i in xrange(BUCKETS):
+            seen += counts[i]
+            if seen >= count * fraction:
+                return min(2 ** i / 1000000.0, maximum)
+        return maximum
+
+
+class AppletStats(object):
+    """
+    Keeps a `LatencyHistogram` per applet id and kind of call into the
+    applet (see `KINDS`). Applets are registered with their id when they are
+    activated, calls into unregistered ones (placeholders) are not recorded.
+    """
+
+    def __init__(self):
+
+        self.applets = {}
+        self.histograms = {}
+
+
+    def register(self, applet, applet_id):
+
+        if applet_id not in self.histograms:
+            self.histograms[applet_id] = dict((kind, LatencyHistogram()) for kind in KINDS)
+        self.applets[applet] = applet_id
+
+
+    def unregister(self, applet):
+        self.applets.pop(applet, None)
+
+
+    def get_id(self, applet):
+        return self.applets.get(applet)
+
+
+    def get_last(self, applet, kind):
+        """ Return the duration of the last call of `kind` into `applet`, or `None`. """
+
+        applet_id = self.applets.get(applet)
+        if applet_id is None:
+            return None
+        return self.histograms[applet_id][kind].last
+
+
+    def record(self, applet, kind, start):
+        """ Record a call of `kind` into `applet` which started at `start`. """
+
+        applet_id = self.applets.get(applet)
+        if applet_id is not None:
+            now = time.time()
+            self.histograms[applet_id][kind].add(now - start, now)
+
+
+    def get_summary(self):
+        """ Return `{applet_id: {kind: summary}}` for all calls in the rolling period. """
+
+        now = time.time()
+        summary = {}
+        for applet_id, histograms in self.histograms.iteritems():
+            summary[applet_id] = dict((kind, histogram.get_summary(now))
+                                      for kind, histogram in histograms.iteritems())
+        return summary
+
+
+    def save(self, filename=STATS_FILE):
+
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump(self.get_summary(), f, indent=4, sort_keys=True)
+
+        return write_atomically(filename, write)
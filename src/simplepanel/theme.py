@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import json
+import hashlib
+import cairo
+
+import cream.gui.svg
+
+from collections import OrderedDict
+
+from simplepanel.util import get_cache_dir, load_png, save_png
+
+CACHE_DIR = get_cache_dir('themes')
+MEMORY_CACHE_SIZE = 12
+TILE_WIDTH = 16
+
+
+class ThemeCache(object):
+    """
+    Cache for rasterized theme files.
+
+    Rasters are keyed by the theme file's path and modification time and the
+    requested size. They are kept in memory and as PNG files in `cache_dir`,
+    so a restart or a resize to an already known size (e.g. when plugging a
+    monitor back in) does not have to touch the SVG at all.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_size=MEMORY_CACHE_SIZE):
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        self._surfaces = OrderedDict()
+
+
+    def get_surface(self, path, width, height, render, variant=None):
+        """
+        Return the raster of `path` at the given size. `render` is called with
+        `(path, width, height)` and has to return a new surface if the raster
+        is neither in memory nor on disk. `variant` distinguishes different
+        renderings of the same file.
+        """
+
+        key = (os.path.abspath(path), os.path.getmtime(path), width, height, variant)
+
+        surface = self._surfaces.pop(key, None)
+        if surface is None:
+            filename = self._get_filename(key)
+            surface = load_png(filename)
+            if surface is None:
+                surface = render(path, width, height)
+                save_png(filename, surface)
+            if len(self._surfaces) >= self.max_size:
+                self._surfaces.popitem(last=False)
+        self._surfaces[key] = surface
+
+        return surface
+
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+    def _get_filename(self, key):
+
+        digest = hashlib.sha1(repr(key)).hexdigest()
+        return os.path.join(self.cache_dir, '{0}.png'.format(digest))
+
+
+def crop(surface, x, width):
+    """ Copy a vertical strip out of `surface`. """
+
+    strip = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, surface.get_height())
+    ctx = cairo.Context(strip)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    ctx.set_source_surface(surface, -x, 0)
+    ctx.paint()
+
+    return strip
+
+
+class SlicedLayer(object):
+    """
+    A theme layer split into a left cap, a horizontally repeated tile and a
+    right cap. Such a layer can be drawn at any width without touching the
+    SVG it was created from.
+    """
+
+    def __init__(self, left, tile, right):
+
+        self.left = left
+        self.tile = tile
+        self.right = right
+
+
+    @classmethod
+    def from_surface(cls, surface, left_width, right_width):
+
+        width = surface.get_width()
+        tile_width = width - left_width - right_width
+
+        return cls(
+            crop(surface, 0, left_width),
+            crop(surface, left_width, tile_width),
+            crop(surface, width - right_width, right_width)
+            )
+
+
+    def paint(self, ctx, width):
+
+        left_width = self.left.get_width()
+        right_width = self.right.get_width()
+        height = self.tile.get_height()
+
+        pattern = cairo.SurfacePattern(self.tile)
+        pattern.set_extend(cairo.EXTEND_REPEAT)
+        pattern.set_matrix(cairo.Matrix(x0=-left_width))
+
+        ctx.set_source(pattern)
+        ctx.rectangle(left_width, 0, max(0, width - left_width - right_width), height)
+        ctx.fill()
+
+        if left_width:
+            ctx.set_source_surface(self.left, 0, 0)
+            ctx.rectangle(0, 0, left_width, height)
+            ctx.fill()
+
+        if right_width:
+            ctx.set_source_surface(self.right, width - right_width, 0)
+            ctx.rectangle(width - right_width, 0, right_width, height)
+            ctx.fill()
+
+
+    def render(self, width):
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, self.tile.get_height())
+        self.paint(cairo.Context(surface), width)
+
+        return surface
+
+
+class Theme(object):
+    """
+    A panel theme as described by the `theme.json` in its directory.
+
+    Every layer names an SVG file and the element which is stretched
+    horizontally. The SVG is rasterized once at a small reference width and
+    cut into caps and a tile (see `SlicedLayer`); arbitrary panel widths are
+    then produced by tiling.
+    """
+
+    def __init__(self, path, cache=None):
+
+        self.path = path
+        self.cache = cache or ThemeCache()
+
+        with open(os.path.join(path, 'theme.json')) as f:
+            self.layers = json.load(f)['layers']
+
+        self._slices = {}
+        self._rasters = {}
+
+
+    def get_mtime(self):
+        """ Return the modification time of the newest file of the theme. """
+
+        files = ['theme.json'] + [layer['file'] for layer in self.layers.itervalues()]
+        return max(os.path.getmtime(os.path.join(self.path, f)) for f in files)
+
+
+    def get_layer(self, name, width, height):
+        """ Return the raster of the given layer at the given size. """
+
+        size, surface = self._rasters.get(name, (None, None))
+        if size == (width, height):
+            return surface
+
+        key = (name, height)
+        if key not in self._slices:
+            self._slices[key] = self._slice(name, height)
+
+        surface = self._slices[key].render(width)
+        self._rasters[name] = ((width, height), surface)
+
+        return surface
+
+
+    def _slice(self, name, height):
+
+        layer = self.layers[name]
+        left, right = layer.get('left', 0), layer.get('right', 0)
+
+        reference = self.cache.get_surface(
+            os.path.join(self.path, layer['file']),
+            left + TILE_WIDTH + right,
+            height,
+            lambda path, width, height: self._render(layer, path, width, height),
+            variant=json.dumps(layer, sort_keys=True)
+            )
+
+        return SlicedLayer.from_surface(reference, left, right)
+
+
+    def _render(self, layer, path, width, height):
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        ctx = cairo.Context(surface)
+        ctx.translate(0, layer.get('offset', 0))
+
+        handle = cream.gui.svg.Handle(path)
+        element = handle.dom.getElementById(layer['element'])
+        element.setAttribute('width', str(width))
+        if 'height' in layer:
+            element.setAttribute('height', str(layer['height']))
+        handle.save_dom()
+        handle.render_cairo(ctx)
+
+        return surface
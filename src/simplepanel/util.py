@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import fcntl
+import signal
+import tempfile
+import gobject
+import cairo
+
+CACHE_HOME = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+
+_signal_pipe = None
+
+
+def get_cache_dir(*parts):
+    """ Return the path of a directory in the panel's user cache. """
+
+    return os.path.join(CACHE_HOME, 'cream', 'simple-panel', *parts)
+
+
+def write_atomically(filename, write):
+    """
+    Call `write` with the path of a temporary file next to `filename` and
+    rename it to `filename` afterwards, once its content reached the disk.
+    Returns whether that succeeded; the caches using this are best effort
+    only.
+    """
+
+    directory = os.path.dirname(filename)
+
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        os.close(fd)
+    except (IOError, OSError):
+        return False
+
+    try:
+        write(tmp)
+        fd = os.open(tmp, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.rename(tmp, filename)
+    except (IOError, OSError, cairo.Error):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+    return True
+
+
+def add_signal_handler(signum, handler):
+    """
+    Call `handler` on the main loop when the process receives `signum`.
+    Python only runs signal handlers when it gets control back, so the main
+    loop is woken up through a pipe instead of polling.
+    """
+
+    global _signal_pipe
+
+    if _signal_pipe is None:
+        _signal_pipe = os.pipe()
+        for fd in _signal_pipe:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+        signal.set_wakeup_fd(_signal_pipe[1])
+        gobject.io_add_watch(_signal_pipe[0], gobject.IO_IN, _signal_pipe_cb)
+
+    signal.signal(signum, lambda *args: gobject.idle_add(handler))
+
+
+def _signal_pipe_cb(fd, condition):
+
+    try:
+        os.read(fd, 64)
+    except OSError:
+        pass
+    return True
+
+
+def load_png(filename):
+    """ Load a PNG into an ImageSurface, returns `None` if that fails. """
+
+    if not os.path.isfile(filename):
+        return None
+
+    try:
+        return cairo.ImageSurface.create_from_png(filename)
+    except (IOError, MemoryError, cairo.Error):
+        return None
+
+
+def save_png(filename, surface):
+    return write_atomically(filename, surface.write_to_png)
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import sys
+import time
+import thread
+import logging
+import threading
+import traceback
+
+import gobject
+
+from simplepanel.loader import get_loader
+
+HEARTBEAT_INTERVAL = 1000
+DEFAULT_THRESHOLD = 0
+REPORT_INTERVAL = 10
+PANEL = 'panel'
+
+logger = logging.getLogger('simplepanel')
+
+
+class MainLoopWatchdog(object):
+    """
+    Detects stalls of the main loop.
+
+    A timeout on the main loop updates a heartbeat, a thread checks that it
+    is not late by more than `threshold` milliseconds. On a stall the main
+    thread's stack is captured and attributed to the innermost applet on it:
+    either a method of an applet instance known to `get_applet_id`, or code
+    from an applet module. Stack traces are logged at most once every
+    `REPORT_INTERVAL` seconds, all stalls are counted per applet. A
+    `threshold` of 0 disables the watchdog, it does not wake up at all then.
+    """
+
+    def __init__(self, get_applet_id, threshold=DEFAULT_THRESHOLD):
+
+        gobject.threads_init()
+
+        self.get_applet_id = get_applet_id
+        self.threshold = threshold
+
+        self.counters = {}
+
+        self._main_thread = thread.get_ident()
+        self._lock = threading.Lock()
+        self._beat = time.time()
+        self._stall = None
+        self._last_report = 0
+        self._suppressed = 0
+        self._source = None
+        self._thread = None
+        self._running = None
+
+
+    def set_threshold(self, threshold):
+
+        self.threshold = threshold
+        if threshold > 0:
+            self.start()
+        else:
+            self.stop()
+
+
+    def start(self):
+
+        if self.threshold <= 0 or self._thread is not None:
+            return
+
+        with self._lock:
+            self._beat = time.time()
+            self._stall = None
+        self._source = gobject.timeout_add(HEARTBEAT_INTERVAL, self._heartbeat)
+
+        self._running = threading.Event()
+        self._running.set()
+        self._thread = threading.Thread(target=self._watch, args=(self._running,))
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+
+        if self._thread is None:
+            return
+
+        gobject.source_remove(self._source)
+        self._source = None
+        self._running.clear()
+        self._thread = None
+
+
+    def get_summary(self):
+        """ Return `{applet_id: (stalls, total seconds, longest stall)}`. """
+
+        with self._lock:
+            return dict(self.counters)
+
+
+    def _heartbeat(self):
+
+        now = time.time()
+
+        with self._lock:
+            self._beat = now
+            stall, self._stall = self._stall, None
+
+        if stall is not None:
+            applet_id, start = stall
+            duration = now - start
+            with self._lock:
+                count, total, longest = self.counters.get(applet_id, (0, 0, 0))
+                self.counters[applet_id] = (count + 1, total + duration, max(longest, duration))
+
+        return True
+
+
+    def _watch(self, running):
+
+        while True:
+            time.sleep(max(self.threshold, HEARTBEAT_INTERVAL) / 2000.0)
+            if not running.is_set():
+                return
+
+            with self._lock:
+                late = time.time() - self._beat - HEARTBEAT_INTERVAL / 1000.0
+                stalled = self._stall is not None
+
+            if stalled or self.threshold <= 0 or late * 1000 < self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._main_thread)
+            if frame is None:
+                continue
+
+            applet_id = self._find_applet(frame)
+            with self._lock:
+                self._stall = (applet_id, self._beat + HEARTBEAT_INTERVAL / 1000.0)
+
+            self._report(applet_id, frame, late)
+            del frame
+
+
+    def _find_applet(self, frame):
+
+        while frame is not None:
+            instance = frame.f_locals.get('self')
+            if instance is not None:
+                try:
+                    applet_id = self.get_applet_id(instance)
+                except TypeError:
+                    applet_id = None
+                if applet_id is not None:
+                    return applet_id
+
+            module = frame.f_globals.get('__name__', '')
+            if module.startswith('applet_'):
+                return get_loader().get_applet_id(module) or module
+
+            frame = frame.f_back
+
+        return PANEL
+
+
+    def _report(self, applet_id, frame, late):
+
+        now = time.time()
+        if now - self._last_report < REPORT_INTERVAL:
+            self._suppressed += 1
+            return
+
+        suppressed, self._suppressed = self._suppressed, 0
+        self._last_report = now
+
+        message = ''.join(traceback.format_stack(frame))
+        if suppressed:
+            message += '({0} more stalls since the last report)'.format(suppressed)
+        logger.warning("Main loop blocked for more than %.0f ms in %s:\n%s", late * 1000, applet_id, message.rstrip('\n'))